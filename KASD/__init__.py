@@ -1,10 +1,172 @@
-from keras.utils.generic_utils import get_custom_objects
-
 from types import FunctionType as FunctionType
-from random import choice as choice
 
+import importlib
+import numpy as np
+import sys
+import os
+
+#custom objects registered before keras is loaded, replaced by the
 #same instance from keras.utils.generic_utils._GLOBAL_CUSTOM_OBJECTS
-_GLOBAL_CUSTOM_OBJECTS = get_custom_objects()
+#in _load_backend
+_GLOBAL_CUSTOM_OBJECTS = {}
+
+#all collections in order of creation, see _registered_custom_objects
+_COLLECTIONS = []
+
+#keras is imported on first use, see _backend
+_BACKEND_LOADED = False
+_BACKEND_MODULES = {}
+_BACKEND_HOOKS = []
+
+def _load_backend():
+    '''
+        Imports keras once. Custom objects registered so far are
+        moved into keras' global custom objects, which then
+        replaces _GLOBAL_CUSTOM_OBJECTS, and the hooks added with
+        _on_backend_load are run.
+    '''
+    global _GLOBAL_CUSTOM_OBJECTS, _BACKEND_LOADED
+    
+    if _BACKEND_LOADED:
+        return
+    
+    from keras.utils.generic_utils import get_custom_objects
+    
+    _BACKEND_LOADED = True #set first, hooks may use the backend
+    
+    custom_objects = get_custom_objects()
+    custom_objects.update(_GLOBAL_CUSTOM_OBJECTS)
+    _GLOBAL_CUSTOM_OBJECTS = custom_objects
+    _RESOLVED.clear()
+    
+    for hook in _BACKEND_HOOKS:
+        hook()
+
+def _backend(name):
+    '''
+        Returns the keras submodule 'name' (e.g. 'layers'),
+        loading keras on first use (see _load_backend).
+        
+        returns module
+    '''
+    try:
+        return _BACKEND_MODULES[name]
+    except KeyError:
+        pass
+    
+    _load_backend()
+    
+    module = _BACKEND_MODULES[name] = importlib.import_module('keras.'+name)
+    return module
+
+def _on_backend_load(hook):
+    '''
+        Runs 'hook' once keras is loaded, or immediately if it
+        already is.
+    '''
+    if _BACKEND_LOADED:
+        hook()
+    else:
+        _BACKEND_HOOKS.append(hook)
+
+#(kind, class_name, custom-object scope): (object, takes custom_objects, source), see _resolve
+_RESOLVED = {}
+
+def _resolve(kind, class_name, custom_objects=None):
+    '''
+        Returns (object, takes custom_objects) of the class or
+        function named 'class_name', looked up as keras does:
+        in 'custom_objects', in the global custom objects, then
+        in keras.<kind>. Returns None if it is not found.
+        
+        Lookups are cached per custom-object scope. The cache is
+        cleared by Collection.custom, and entries are checked
+        against the global custom objects on each hit, so objects
+        added to them directly (e.g. by a CustomObjectScope) are
+        never shadowed.
+    '''
+    module = _backend(kind)
+    
+    try:
+        key = (kind, class_name, frozenset(custom_objects.items()) if custom_objects else None)
+    except TypeError: #unhashable custom objects
+        key = None
+    
+    if not key is None and key in _RESOLVED:
+        obj, takes_custom_objects, source = _RESOLVED[key]
+        
+        if source == 'custom' or _GLOBAL_CUSTOM_OBJECTS.get(class_name) is (obj if source == 'global' else None):
+            return obj, takes_custom_objects
+    
+    if custom_objects and class_name in custom_objects:
+        obj, source = custom_objects[class_name], 'custom'
+    elif class_name in _GLOBAL_CUSTOM_OBJECTS:
+        obj, source = _GLOBAL_CUSTOM_OBJECTS[class_name], 'global'
+    else:
+        obj, source = getattr(module, class_name, None), 'module'
+        
+        if obj is None:
+            return None
+    
+    takes_custom_objects = hasattr(obj, 'from_config') and _backend('utils.generic_utils').has_arg(obj.from_config, 'custom_objects')
+    
+    if not key is None:
+        _RESOLVED[key] = (obj, takes_custom_objects, source)
+    
+    return obj, takes_custom_objects
+
+def _deserialize_object(kind, identifier, custom_objects=None):
+    '''
+        Same as keras.<kind>.deserialize, but the class or
+        function of 'identifier' is resolved through the cache
+        of _resolve, so only the instance is constructed on each
+        call. Identifiers that cannot be resolved are passed to
+        keras.<kind>.deserialize.
+    '''
+    if isinstance(identifier, dict) and 'class_name' in identifier and 'config' in identifier:
+        resolved = _resolve(kind, identifier['class_name'], custom_objects)
+    elif isinstance(identifier, str):
+        resolved = _resolve(kind, identifier, custom_objects)
+    else:
+        resolved = None
+    
+    if resolved is None or (isinstance(identifier, dict) and not hasattr(resolved[0], 'from_config')):
+        return _backend(kind).deserialize(identifier, custom_objects=custom_objects)
+    
+    obj, takes_custom_objects = resolved
+    
+    if not isinstance(identifier, dict):
+        return obj
+    elif takes_custom_objects:
+        return obj.from_config(identifier['config'], custom_objects=dict(list(_GLOBAL_CUSTOM_OBJECTS.items())+list((custom_objects or {}).items())))
+    elif custom_objects:
+        with _backend('utils.generic_utils').CustomObjectScope(custom_objects):
+            return obj.from_config(identifier['config'])
+    else:
+        return obj.from_config(identifier['config'])
+
+def _as_seed_sequence(seed):
+    '''
+        Converts None, an int, a SeedSequence or a Generator
+        into a numpy.random.SeedSequence. Returns None for a
+        Generator whose SeedSequence cannot be recovered.
+    '''
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    elif isinstance(seed, np.random.Generator):
+        return getattr(seed.bit_generator, 'seed_seq', getattr(seed.bit_generator, '_seed_seq', None))
+    else:
+        return np.random.SeedSequence(seed)
+
+def _as_generator(seed):
+    '''
+        Converts an int, a SeedSequence or a Generator into a
+        numpy.random.Generator.
+    '''
+    if isinstance(seed, np.random.Generator):
+        return seed
+    else:
+        return np.random.default_rng(_as_seed_sequence(seed))
 
 class Collection():
     '''
@@ -25,6 +187,37 @@ class Collection():
         
         native_objects: #list
             Lists all native keras objects class_names.
+    
+    Indexing:
+        Names are also kept in a set (self._names) that is
+        maintained incrementally by self.custom, so membership
+        checks do not scale with the size of the registry.
+        Filtered candidate pools used by self.choice are cached
+        by their (include, exclude, exclusive) signature in
+        self._pools, and the cache is cleared whenever the
+        registry changes (see self._invalidate).
+        
+        Labels are mirrored in an inverted index (label -> set of
+        names) in self._label_index, and the unions/intersections
+        of labels requested by self.choice are cached in
+        self._label_sets.
+    
+    Lazy Loading:
+        Names and labels do not require keras, so collections can
+        be used to sample names before keras is imported. Keras
+        is loaded on the first serialization or deserialization
+        (see _backend); native names the installed keras does not
+        provide are then removed from the labels (see
+        self._prune_labels). Custom objects registered once keras
+        has been imported (by any module) load it right away, so
+        they are always visible to keras' own deserialization
+        (e.g. keras.models.load_model).
+    
+    Random Number Generation:
+        Each collection owns a numpy.random.Generator (see
+        self.seed). Draws can be made reproducible by seeding
+        the collection or by passing 'seed' to self.choice and
+        self.sample, and are re-derived per process after a fork.
     '''
     
     @property
@@ -36,17 +229,161 @@ class Collection():
     @property
     def all(self): return self._native_objects+self._custom_objects
     
-    def __init__(self, native_objects, _type='class'):
+    def __init__(self, native_objects, _type='class', seed=None):
         assert _type == 'class' or _type =='function'
         
         self._labels = {}
+        self._label_index = {}
+        self._label_sets = {}
         
         self._custom_objects = []
         self._native_objects = native_objects
         
+        self._names = set(native_objects)
+        self._pools = {}
+        self._arrays = {}
+        
         self._type = _type
+        
+        self.seed(seed)
+        
+        _COLLECTIONS.append(self)
+    
+    ######Random Number Generation######
+    
+    def seed(self, seed=None):
+        '''
+            Sets the random number generator used by self.choice
+            and self.sample. 'seed' can be None (fresh entropy),
+            an int, a numpy.random.SeedSequence or a
+            numpy.random.Generator.
+            
+            The generator is bound to the current process. If the
+            collection is used in a forked child process, a new
+            generator is derived from the SeedSequence and the
+            child's pid, so workers never share a stream.
+        '''
+        self._seed_sequence = _as_seed_sequence(seed)
+        self._rng = _as_generator(seed)
+        self._pid = os.getpid()
+    
+    def spawn(self, n):
+        '''
+            Returns 'n' independent SeedSequences spawned from
+            this collection's SeedSequence. Pass one to
+            self.seed in each worker for independent, replayable
+            streams.
+        '''
+        if self._seed_sequence is None:
+            self._seed_sequence = np.random.SeedSequence()
+        
+        return self._seed_sequence.spawn(n)
+    
+    def _generator(self, seed=None):
+        '''
+            Returns the numpy.random.Generator for a draw. A per
+            call 'seed' takes precedence over the collection's
+            generator.
+        '''
+        if not seed is None:
+            return _as_generator(seed)
+        
+        pid = os.getpid()
+        if pid != self._pid: #forked, derive a child stream
+            if self._seed_sequence is None:
+                seed_sequence = np.random.SeedSequence()
+            else:
+                seed_sequence = np.random.SeedSequence(self._seed_sequence.entropy, spawn_key=tuple(self._seed_sequence.spawn_key)+(pid,))
+            
+            self._rng = np.random.default_rng(seed_sequence)
+            self._pid = pid
+        
+        return self._rng
+    
+    def _invalidate(self):
+        '''
+            Clears all cached candidate pools. Must be called
+            whenever names or labels are added to the registry.
+        '''
+        self._pools.clear()
+        self._arrays.clear()
+        self._label_sets.clear()
+    
+    def _signature(self, include, exclude, exclusive, labels=[], exclude_labels=[], match_all=False):
+        '''
+            Returns the hashable cache key of a set of filters.
+            Each filter can be a str or a list of str, as in
+            self.label.
+        '''
+        def names(value):
+            return (value,) if isinstance(value, str) else value
+        
+        return (tuple(names(include)), frozenset(names(exclude)), frozenset(names(exclusive)),
+                frozenset(names(labels)), frozenset(names(exclude_labels)), bool(match_all))
     
-    def choice(self, include=[], exclude=[], exclusive=[]):
+    def _label_set(self, labels, match_all=False):
+        '''
+            Returns the cached frozenset of names that carry any
+            (union) or, if match_all is True, every (intersection)
+            label in 'labels'. Unknown labels are treated as empty.
+        '''
+        key = (frozenset(labels), bool(match_all))
+        
+        try:
+            return self._label_sets[key]
+        except KeyError:
+            pass
+        
+        sets = [self._label_index.get(label, frozenset()) for label in key[0]]
+        
+        if len(sets) == 0:
+            names = frozenset()
+        elif match_all:
+            names = frozenset(sets[0]).intersection(*sets[1:])
+        else:
+            names = frozenset().union(*sets)
+        
+        self._label_sets[key] = names
+        return names
+    
+    def _pool(self, key):
+        '''
+            Returns the filtered candidate pool (tuple) for the
+            given signature, computing it only on a cache miss.
+            The pool keeps the order and multiplicity of
+            self._native_objects + self._custom_objects + include
+            so that draws are distributed as before.
+        '''
+        try:
+            return self._pools[key]
+        except KeyError:
+            pass
+        
+        include, exclude, exclusive, labels, exclude_labels, match_all = key
+        
+        if labels:
+            labelled = self._label_set(labels, match_all)
+        if exclude_labels:
+            exclude = exclude | self._label_set(exclude_labels)
+        
+        pool = tuple(item for item in self._native_objects + self._custom_objects + list(include)
+                     if (not exclusive or item in exclusive) and (not labels or item in labelled) and not item in exclude)
+        
+        self._pools[key] = pool
+        return pool
+    
+    def _pool_array(self, key):
+        '''
+            Same as self._pool, but returns the pool as a cached
+            numpy array for vectorized indexing.
+        '''
+        try:
+            return self._arrays[key]
+        except KeyError:
+            array = self._arrays[key] = np.array(self._pool(key))
+            return array
+    
+    def choice(self, include=[], exclude=[], exclusive=[], labels=[], exclude_labels=[], match_all=False, seed=None):
         '''
             Returns a random str value from self.customs keys
             and self._native_objects filtered to consider include,
@@ -56,11 +393,62 @@ class Collection():
             mentioned in 'exclude' will also be filtered out
             (In order include, exclusive then exclude filters
             are applied).
+            
+            Names can also be filtered by label. If 'labels' is not
+            empty, only names carrying any of them (or all of them
+            when match_all is True) are kept, and names carrying
+            any label in 'exclude_labels' are filtered out. Every
+            filter can be a str or a list of str.
+            
+            Filtered pools are cached by signature, so repeated
+            draws with the same filters are constant-time.
+            
+            *seed:      Optional int, SeedSequence or Generator
+                        used for this draw instead of the
+                        collection's generator.
+        '''
+        pool = self._pool(self._signature(include, exclude, exclusive, labels, exclude_labels, match_all))
+        
+        if len(pool) == 0:
+            raise IndexError('Cannot choose from an empty sequence')
+        
+        return pool[self._generator(seed).integers(len(pool))]
+    
+    def sample(self, n, include=[], exclude=[], exclusive=[], labels=[], exclude_labels=[], match_all=False, weights=None, seed=None):
         '''
-        def _filter(item):
-            return (len(exclusive) == 0 or item in exclusive) and not item in exclude
+            Returns a list of 'n' random str values drawn with
+            replacement from the same candidate pool used by
+            self.choice. The pool is resolved once and all
+            draws are made through a numpy.random.Generator.
+            
+            *weights:   Optional dict of {name: relative weight}.
+                        Names that are not listed keep a weight
+                        of 1.0.
+            
+            *seed:      Optional int, SeedSequence or Generator
+                        used for this draw instead of the
+                        collection's generator.
+        '''
+        key = self._signature(include, exclude, exclusive, labels, exclude_labels, match_all)
+        pool = self._pool(key)
+        
+        if len(pool) == 0:
+            raise IndexError('Cannot choose from an empty sequence')
+        
+        if weights:
+            p = np.array([weights.get(item, 1.0) for item in pool], dtype=float)
+            p /= p.sum()
+        else:
+            p = None
+        
+        rng = self._generator(seed)
         
-        return choice(list(filter(_filter, self._native_objects + self._custom_objects + include)))
+        if p is None:
+            indices = rng.integers(0, len(pool), size=n)
+        else:
+            indices = rng.choice(len(pool), size=n, p=p)
+        
+        return self._pool_array(key)[indices].tolist()
     
     ######Decorators/Wrappers######
         
@@ -82,6 +470,8 @@ class Collection():
             wrapper functionality will be disabled). Is used to
             label a keras object which can be seen in the dict
             self.label. labels can be a str or a list of str.
+            The inverted index self._label_index is updated in
+            step with self._labels.
         '''
         assert isinstance(labels, (str, list, tuple))
         
@@ -91,17 +481,21 @@ class Collection():
         def wrapper(func):
             name = func if isinstance(func, str) else func.__name__
             
-            if not name in self._native_objects+self._custom_objects:
+            if not name in self._names:
                 raise AttributeError("'{}' is not a recognized native or custom keras object.".format(func))
             
             for label in labels:
                 assert isinstance(label, str)
                 
                 if label in self._labels:
-                    if not name in self._labels[label]:
+                    if not name in self._label_index[label]:
                         self._labels[label].append(name)
+                        self._label_index[label].add(name)
+                        self._invalidate()
                 else:
                     self._labels.update({label: [name]})
+                    self._label_index.update({label: set([name])})
+                    self._invalidate()
             
             return func
         
@@ -110,6 +504,24 @@ class Collection():
         else:
             wrapper(func)
     
+    def _prune_labels(self, available):
+        '''
+            Removes the native names that are not in 'available'
+            from every label, and labels that become empty.
+            Custom names are kept.
+        '''
+        missing = set(self._native_objects).difference(available)
+        
+        for label, names in list(self._labels.items()):
+            if any(name in missing for name in names):
+                names[:] = [name for name in names if not name in missing]
+                self._label_index[label].difference_update(missing)
+                
+                if len(names) == 0:
+                    del self._labels[label], self._label_index[label]
+                
+                self._invalidate()
+    
     def custom(self, func):
         '''
             Is a decorator used to identify a custom keras
@@ -118,13 +530,19 @@ class Collection():
         '''
         name = func.__name__
         
+        if not _BACKEND_LOADED and 'keras' in sys.modules: #keras is in use, register in its custom objects right away
+            _load_backend()
+        
         if self._type == 'class' and not isinstance(func, type):
             raise AttributeError("'func' must be a class type.")
         elif self._type == 'function' and not isinstance(func, FunctionType):
             raise AttributeError("'func' must be a function type.")
 
-        if not name in self._custom_objects+self._native_objects and not name in _GLOBAL_CUSTOM_OBJECTS:
+        if not name in self._names and not name in _GLOBAL_CUSTOM_OBJECTS:
             self._custom_objects.append(name)
+            self._names.add(name)
+            self._invalidate()
+            _RESOLVED.clear()
             
             #allows for the globalization of custom keras objects,
             #all names must be unique or they will be overwritten.
@@ -134,11 +552,33 @@ class Collection():
         
         return func
 
+def _registered_custom_objects():
+    '''
+        Returns every custom object registered through
+        Collection.custom as a picklable list of
+        (collection index, object), e.g. to replicate the
+        registries in other processes.
+    '''
+    return [(i, _GLOBAL_CUSTOM_OBJECTS[name]) for i, collection in enumerate(_COLLECTIONS)
+            for name in collection.custom_objects if name in _GLOBAL_CUSTOM_OBJECTS]
+
+def _register_custom_objects(items):
+    '''
+        Registers the output of _registered_custom_objects in
+        this process, skipping objects that are already known.
+    '''
+    for i, func in items:
+        if not func.__name__ in _GLOBAL_CUSTOM_OBJECTS:
+            _COLLECTIONS[i].custom(func)
+
 from . import layers
 from . import activations
 from . import constraints
 from . import initializers
 from . import regularizers
+from . import shapes
+from . import graph
+from . import storage
 
 
 
@@ -58,13 +58,17 @@ Functionality:
     *label              : (@func) USed to label custom/native keras activations.
 '''
 
-from keras.activations import serialize, deserialize as _deserialize
+from . import _backend, _on_backend_load, _deserialize_object
+
 import warnings
 import six
 
+def serialize(activation):
+    return _backend('activations').serialize(activation)
+
 def deserialize(identifier, custom_objects=None):
     try:
-        return _deserialize(identifier, custom_objects=custom_objects)
+        return _deserialize_object('activations', identifier, custom_objects=custom_objects)
     except:
         raise AttributeError("Use the activations.custom decorator for custom object support.")
 
@@ -84,7 +88,7 @@ def get(identifier):
         except:
             return None
     elif callable(identifier):
-        if isinstance(identifier, Layer):
+        if isinstance(identifier, _backend('layers').Layer):
             warnings.warn(
                 'Do not pass a layer instance (such as {identifier}) as the '
                 'activation argument of another layer. Instead, advanced '
@@ -110,8 +114,7 @@ activations = _Activations(_GLOBAL_LABELS['activations'], _type='function')
 custom = activations.custom
 label = activations.label
 
-from keras import activations as _activations
+[activations.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value]
 
-_dir = dir(_activations)
-[activations.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value if name in _dir] #ensures native keras objects
+_on_backend_load(lambda: activations._prune_labels(dir(_backend('activations')))) #ensures native keras objects
 
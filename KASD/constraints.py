@@ -58,12 +58,16 @@ Functionality:
     *label              : (@func) USed to label custom/native keras constraints.
 '''
 
-from keras.constraints import serialize, deserialize as _deserialize
+from . import _backend, _on_backend_load, _deserialize_object
+
 import six
 
+def serialize(constraint):
+    return _backend('constraints').serialize(constraint)
+
 def deserialize(identifier, custom_objects=None):
     try:
-        return _deserialize(identifier, custom_objects=custom_objects)
+        return _deserialize_object('constraints', identifier, custom_objects=custom_objects)
     except:
         raise AttributeError("Use the constraints.custom decorator for custom object support.")
 
@@ -96,8 +100,7 @@ constraints = _Constraints(_GLOBAL_LABELS['constraints'])
 custom = constraints.custom
 label = constraints.label
 
-from keras import constraints as _constraints
+[constraints.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value]
 
-_dir = dir(_constraints)
-[constraints.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value if name in _dir] #ensures native keras objects
+_on_backend_load(lambda: constraints._prune_labels(dir(_backend('constraints')))) #ensures native keras objects
 
@@ -0,0 +1,387 @@
+'''
+Description:
+    Contains a pure python cost model for advanced serials and
+    series. The parameter count, multiply-accumulate count
+    (MACs) and activation size of each layer are computed
+    directly from 'class_name', 'config', 'input_shape' and
+    'output_shape' without importing the keras backend, so
+    candidate series can be ranked before they are built.
+    
+    MACs count the multiplications of a forward pass (in
+    inference mode) for a single sample; additions, comparisons
+    and data movement (e.g. pooling, padding, reshaping) are
+    not counted. Activation sizes are numbers of elements per
+    sample. Costs that depend on undefined dimensions (other
+    than the batch dimension) are None.
+
+Customization:
+    Use the register decorator to add a cost function for a
+    custom layer. A cost function receives the layer config,
+    the input shape and the output shape and returns
+    (params, macs).
+    
+    Example on how to register a custom cost function:
+        from KASD.costs import register
+        
+        @register('layer')
+        def layer_cost(config, input_shape, output_shape):
+            return 0, 0
+
+Functionality:
+    *Cost           : (namedtuple) Used to hold the params, macs and activations of a layer.
+    *compute_cost   : (func) Used to compute the Cost of an advanced serial.
+    *estimate       : (func) Used to compute the costs, totals and peak activation memory of an advanced series.
+    *register       : (@func) Used to register a cost function for a class_name.
+'''
+
+from .shapes import _Unsupported, _infer, _normalize, _prod, _split, _tuple, _cell_units, conv_output_length
+from .graph import DependencyIndex
+
+from collections import namedtuple
+
+_COST_FUNCTIONS = {}
+
+#params: number of weights (trainable and not), macs: multiplications per sample,
+#activations: number of output elements per sample
+Cost = namedtuple('Cost', ('params', 'macs', 'activations'))
+
+def register(*class_names):
+    '''
+        Is a decorator used to register a cost function
+        for one or more class_names.
+    '''
+    def wrapper(func):
+        for class_name in class_names:
+            _COST_FUNCTIONS[class_name] = func
+        return func
+    
+    return wrapper
+
+######Helpers######
+
+def _add(*values):
+    total = 0
+    for value in values:
+        if value is None:
+            return None
+        total += value
+    return total
+
+def _mul(*values):
+    return _prod(values)
+
+def _elements(shape):
+    '''
+        Returns the number of elements per sample of a shape,
+        or of a list of shapes.
+    '''
+    if isinstance(shape, list):
+        return _add(*[_elements(item) for item in shape])
+    else:
+        return _prod(shape[1:])
+
+def _bias(config, size):
+    return size if config.get('use_bias', True) else 0
+
+######Cost Functions######
+
+@register('InputLayer', 'Activation', 'Dropout', 'ActivityRegularization', 'Masking', 'SpatialDropout1D', 'SpatialDropout2D',
+          'SpatialDropout3D', 'GaussianNoise', 'GaussianDropout', 'AlphaDropout', 'LeakyReLU', 'ELU', 'ThresholdedReLU',
+          'Softmax', 'ReLU', 'Flatten', 'Reshape', 'Permute', 'RepeatVector', 'Lambda', 'Add', 'Subtract', 'Average',
+          'Maximum', 'Minimum', 'Concatenate', 'Cropping1D', 'Cropping2D', 'Cropping3D', 'ZeroPadding1D', 'ZeroPadding2D',
+          'ZeroPadding3D', 'UpSampling1D', 'UpSampling2D', 'UpSampling3D', 'MaxPooling1D', 'MaxPooling2D', 'MaxPooling3D',
+          'AveragePooling1D', 'AveragePooling2D', 'AveragePooling3D', 'GlobalMaxPooling1D', 'GlobalMaxPooling2D',
+          'GlobalMaxPooling3D', 'GlobalAveragePooling1D', 'GlobalAveragePooling2D', 'GlobalAveragePooling3D')
+def _free(config, input_shape, output_shape):
+    return 0, 0
+
+@register('Dense')
+def _dense(config, input_shape, output_shape):
+    weights = _mul(input_shape[-1], config['units'])
+    return _add(weights, _bias(config, config['units'])), _mul(weights, _prod(input_shape[1:-1]))
+
+@register('Multiply')
+def _multiply(config, input_shape, output_shape):
+    return 0, _mul(_elements(output_shape), len(input_shape)-1)
+
+@register('Dot')
+def _dot(config, input_shape, output_shape):
+    axes = config['axes']
+    axis = (axes if isinstance(axes, int) else axes[0]) % len(input_shape[0])
+    return 0, _mul(_elements(output_shape), input_shape[0][axis])
+
+@register('Embedding')
+def _embedding(config, input_shape, output_shape):
+    return config['input_dim']*config['output_dim'], 0
+
+@register('BatchNormalization')
+def _batch_normalization(config, input_shape, output_shape):
+    axis = config.get('axis', -1)
+    channels = _prod([input_shape[i] for i in _tuple(axis, 1)])
+    
+    #moving mean and variance, plus gamma and beta when enabled
+    return _mul(channels, 2+int(config.get('scale', True))+int(config.get('center', True))), _elements(output_shape)
+
+@register('PReLU')
+def _prelu(config, input_shape, output_shape):
+    shape = list(input_shape[1:])
+    for axis in _tuple(config.get('shared_axes') or (), 1):
+        shape[axis-1] = 1
+    
+    return _prod(shape), _elements(output_shape)
+
+def _conv(config, input_shape, output_shape, transpose=False):
+    data_format = config.get('data_format', 'channels_last')
+    _, input_spatial, channels = _split(input_shape, data_format)
+    _, output_spatial, filters = _split(output_shape, data_format)
+    
+    kernel_size = _prod(_tuple(config['kernel_size'], len(input_spatial)))
+    weights = _mul(kernel_size, None if channels is None else channels//config.get('groups', 1), filters)
+    
+    return _add(weights, _bias(config, filters)), _mul(weights, _prod(input_spatial if transpose else output_spatial))
+
+@register('Conv1D', 'Conv2D', 'Conv3D')
+def _convolution(config, input_shape, output_shape):
+    return _conv(config, input_shape, output_shape)
+
+@register('Conv2DTranspose', 'Conv3DTranspose')
+def _convolution_transpose(config, input_shape, output_shape):
+    return _conv(config, input_shape, output_shape, transpose=True)
+
+@register('SeparableConv1D', 'SeparableConv2D')
+def _separable_conv(config, input_shape, output_shape):
+    data_format = config.get('data_format', 'channels_last')
+    channels = _split(input_shape, data_format)[2]
+    _, spatial, filters = _split(output_shape, data_format)
+    
+    depthwise = _mul(_prod(_tuple(config['kernel_size'], len(spatial))), channels, config.get('depth_multiplier', 1))
+    pointwise = _mul(channels, config.get('depth_multiplier', 1), filters)
+    
+    return _add(depthwise, pointwise, _bias(config, filters)), _mul(_add(depthwise, pointwise), _prod(spatial))
+
+@register('DepthwiseConv2D')
+def _depthwise_conv(config, input_shape, output_shape):
+    data_format = config.get('data_format', 'channels_last')
+    _, spatial, channels = _split(output_shape, data_format)
+    weights = _mul(_prod(_tuple(config['kernel_size'], 2)), _split(input_shape, data_format)[2], config.get('depth_multiplier', 1))
+    
+    return _add(weights, _bias(config, channels)), _mul(weights, _prod(spatial))
+
+@register('LocallyConnected1D', 'LocallyConnected2D')
+def _locally_connected(config, input_shape, output_shape):
+    data_format = config.get('data_format', 'channels_last')
+    channels = _split(input_shape, data_format)[2]
+    _, spatial, filters = _split(output_shape, data_format)
+    
+    #unshared weights: one kernel (and bias) per output position
+    weights = _mul(_prod(spatial), _prod(_tuple(config['kernel_size'], len(spatial))), channels, filters)
+    
+    return _add(weights, _bias(config, _mul(_prod(spatial), filters))), weights
+
+######Recurrent Cost Functions######
+
+_GATES = {'SimpleRNNCell': 1, 'GRUCell': 3, 'LSTMCell': 4, 'SimpleRNN': 1, 'GRU': 3, 'LSTM': 4, 'CuDNNGRU': 3, 'CuDNNLSTM': 4}
+
+def _recurrent_cell(class_name):
+    '''
+        Returns the cost function of a cell, or of the single
+        step of a recurrent layer: input_shape is the shape of
+        one step and macs are per step.
+    '''
+    def cost_function(config, input_shape, output_shape):
+        gates, units = _GATES[class_name], config['units']
+        weights = _mul(gates, units, _add(input_shape[-1], units))
+        
+        if class_name.startswith('CuDNN') or config.get('reset_after', False): #separate input and recurrent biases
+            biases = _bias(config, 2*gates*units)
+        else:
+            biases = _bias(config, gates*units)
+        
+        return _add(weights, biases), weights
+    
+    return cost_function
+
+for _class_name in ('SimpleRNNCell', 'GRUCell', 'LSTMCell'):
+    register(_class_name)(_recurrent_cell(_class_name))
+
+@register('StackedRNNCells')
+def _stacked_cells(config, input_shape, output_shape):
+    params = macs = 0
+    
+    for cell in config['cells']:
+        cell_params, cell_macs = _cost(cell['class_name'], cell['config'], input_shape, None)
+        params, macs = _add(params, cell_params), _add(macs, cell_macs)
+        input_shape = (input_shape[0], _cell_units(cell)[0])
+    
+    return params, macs
+
+@register('ConvLSTM2DCell')
+def _conv_lstm_cell(config, input_shape, output_shape):
+    data_format = config.get('data_format', 'channels_last')
+    _, spatial, channels = _split(input_shape, data_format)
+    
+    kernel_size = _tuple(config['kernel_size'], 2)
+    strides = _tuple(config.get('strides', 1), 2)
+    dilation_rate = _tuple(config.get('dilation_rate', 1), 2)
+    padding = config.get('padding', 'valid')
+    filters = config['filters']
+    
+    spatial = [conv_output_length(spatial[i], kernel_size[i], padding, strides[i], dilation_rate[i]) for i in range(2)]
+    weights = _mul(4, filters, _prod(kernel_size), _add(channels, filters)) #input and recurrent kernels
+    
+    return _add(weights, _bias(config, 4*filters)), _mul(weights, _prod(spatial))
+
+def _step_shape(input_shape):
+    return (input_shape[0],)+tuple(input_shape[2:])
+
+def _steps(step_cost, input_shape):
+    '''
+        Returns (params, macs) of a recurrent layer from the
+        (params, macs) of one step and the timesteps of
+        'input_shape'.
+    '''
+    params, macs = step_cost
+    return params, _mul(macs, input_shape[1])
+
+@register('RNN', 'ConvRNN2D')
+def _rnn(config, input_shape, output_shape):
+    cell = config['cell']
+    return _steps(_cost(cell['class_name'], cell['config'], _step_shape(input_shape), None), input_shape)
+
+def _recurrent(cell_function):
+    def cost_function(config, input_shape, output_shape):
+        return _steps(cell_function(config, _step_shape(input_shape), None), input_shape)
+    
+    return cost_function
+
+for _class_name in ('SimpleRNN', 'GRU', 'LSTM', 'CuDNNGRU', 'CuDNNLSTM'):
+    register(_class_name)(_recurrent(_recurrent_cell(_class_name)))
+
+register('ConvLSTM2D')(_recurrent(_conv_lstm_cell))
+
+######Wrapper Cost Functions######
+
+@register('Bidirectional')
+def _bidirectional(config, input_shape, output_shape):
+    layer = config['layer']
+    
+    try:
+        layer_output_shape = _normalize(_infer(layer['class_name'], layer['config'], input_shape))
+    except (_Unsupported, KeyError, TypeError, IndexError):
+        layer_output_shape = None
+    
+    params, macs = _cost(layer['class_name'], layer['config'], input_shape, layer_output_shape)
+    return _mul(params, 2), _mul(macs, 2)
+
+@register('TimeDistributed')
+def _time_distributed(config, input_shape, output_shape):
+    layer = config['layer']
+    
+    params, macs = _cost(layer['class_name'], layer['config'], (input_shape[0],)+tuple(input_shape[2:]),
+                         (output_shape[0],)+tuple(output_shape[2:]))
+    return params, _mul(macs, input_shape[1])
+
+######Engine######
+
+def _cost(class_name, config, input_shape, output_shape):
+    if not class_name in _COST_FUNCTIONS:
+        raise ValueError("No cost function is registered for '{}', see KASD.costs.register.".format(class_name))
+    return _COST_FUNCTIONS[class_name](config, input_shape, output_shape)
+
+def _node_input_shapes(ref_node):
+    input_shapes = [tuple(ref[3]) for ref in ref_node]
+    return input_shapes[0] if len(input_shapes) == 1 else input_shapes
+
+def compute_cost(serial):
+    '''
+        This function is used to compute the Cost (params,
+        macs, activations) of an advanced serial from its
+        'class_name', 'config', 'input_shape' and
+        'output_shape'. For layers called more than once (see
+        'inbound_nodes' in KASD.layers.serialize), params are
+        counted once while macs and activations are summed over
+        every call. Raises a ValueError for layers without a
+        registered cost function.
+        
+        returns Cost
+    '''
+    class_name, config = serial['class_name'], serial['config']
+    input_shape, output_shape = _normalize(serial['input_shape']), _normalize(serial['output_shape'])
+    
+    params, node_macs = _cost(class_name, config, input_shape, output_shape)
+    macs, activations = node_macs, _elements(output_shape)
+    
+    for ref_node in serial.get('inbound_nodes', [])[1:]:
+        node_input_shape = _node_input_shapes(ref_node)
+        
+        if node_input_shape == input_shape:
+            macs, activations = _add(macs, node_macs), _add(activations, _elements(output_shape))
+            continue
+        
+        try:
+            node_output_shape = _normalize(_infer(class_name, config, node_input_shape))
+        except (_Unsupported, KeyError, TypeError, IndexError):
+            return Cost(params, None, None)
+        
+        macs = _add(macs, _cost(class_name, config, node_input_shape, node_output_shape)[1])
+        activations = _add(activations, _elements(node_output_shape))
+    
+    return Cost(params, macs, activations)
+
+def _input_elements(serial, input_name):
+    if len(serial['input']) == 1:
+        return _elements(_normalize(serial['input_shape']))
+    else:
+        return _elements(_normalize(serial['input_shape'][serial['input'].index(input_name)]))
+
+def estimate(series, batch_size=1, bytes_per_element=4, index=None):
+    '''
+        This function is used to compute the cost of every
+        layer of an advanced series (see compute_cost) and its
+        totals in one pass. Peak activation memory is simulated
+        over a topological order of the series: inputs and
+        layer outputs are kept until their last consumer has
+        run, and outputs without consumers until the end.
+        
+        *batch_size:        Number of samples the totals of
+                            'macs' and 'peak_memory' are given for.
+        
+        *bytes_per_element: Size of an activation element (e.g.
+                            4 for float32).
+        
+        *index:             Optional KASD.graph.DependencyIndex of
+                            the series, to avoid indexing it on
+                            every call.
+        
+        returns dict of:
+            'layers':       {'name': Cost} in topological order.
+            'params':       Total parameter count.
+            'macs':         Total MACs for 'batch_size' samples.
+            'peak_memory':  Peak activation memory in bytes for
+                            'batch_size' samples.
+    '''
+    if index is None:
+        index = DependencyIndex(series)
+    
+    remaining = dict((name, len(consumers)) for name, consumers in index.consumers.items())
+    sizes = dict((input_name, _input_elements(series[index.consumers[input_name][0]], input_name)) for input_name in index.inputs)
+    live = peak = _add(*sizes.values())
+    costs = {}
+    
+    for name in index.order():
+        serial = series[name]
+        cost = costs[name] = compute_cost(serial)
+        sizes[name] = cost.activations
+        
+        live = _add(live, cost.activations)
+        peak = None if live is None or peak is None else max(peak, live)
+        
+        for input_name in set(serial['input']):
+            remaining[input_name] -= 1
+            if remaining[input_name] == 0:
+                live = _add(live, None if sizes[input_name] is None else -sizes[input_name])
+    
+    return {'layers': costs,
+            'params': _add(*[cost.params for cost in costs.values()]),
+            'macs': _mul(_add(*[cost.macs for cost in costs.values()]), batch_size),
+            'peak_memory': _mul(peak, batch_size, bytes_per_element)}
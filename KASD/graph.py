@@ -0,0 +1,647 @@
+'''
+Description:
+    Contains pure python tools for the structure of advanced
+    serials and series (see KASD.layers.serialize). None of
+    these tools build keras objects.
+
+Functionality:
+    *fingerprint        : (func) Used to compute a canonical, name independent hash of a serial/series.
+    *DependencyIndex    : (class) Used to query the producers and consumers of each layer in a series.
+    *topological_sort   : (func) Used to reorder a series so layers come after their inputs.
+    *extract            : (func) Used to cut the subgraph between named layers out of a series.
+    *splice             : (func) Used to insert a subgraph into a series.
+    *diff               : (func) Used to compute the edit script between two series.
+    *apply_patch        : (func) Used to replay an edit script from diff on a series.
+'''
+
+from collections import deque
+from copy import deepcopy
+
+import hashlib
+import json
+
+_ADVANCED_KEYS = frozenset(('config', 'class_name', 'input', 'input_shape', 'output_shape'))
+
+def _strip_names(config):
+    '''
+        Returns a copy of a layer config without 'name' keys,
+        including the configs of nested layer serials (e.g. the
+        'layer' of a Wrapper or the 'cell' of an RNN).
+    '''
+    def strip(value):
+        if isinstance(value, dict):
+            if 'class_name' in value and isinstance(value.get('config'), dict):
+                return {'class_name': value['class_name'], 'config': _strip_names(value['config'])}
+            return {key: strip(item) for key, item in value.items()}
+        elif isinstance(value, (list, tuple)):
+            return [strip(item) for item in value]
+        else:
+            return value
+    
+    return {key: strip(value) for key, value in config.items() if key != 'name'}
+
+def _digest(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, separators=(',', ':'), default=repr).encode('utf-8')).hexdigest()
+
+def _input_shapes(serial):
+    return [serial['input_shape']] if len(serial['input']) == 1 else list(serial['input_shape'])
+
+def _output_ref_shape(output_shape, tensor_index):
+    '''
+        Returns the shape of the output 'tensor_index' of a layer
+        whose 'output_shape' is a shape or a list of shapes
+        (multiple outputs).
+    '''
+    if isinstance(output_shape, (list, tuple)) and len(output_shape) > 0 and isinstance(output_shape[0], (list, tuple)):
+        return output_shape[tensor_index]
+    return output_shape
+
+def _first_ref(serial, i):
+    '''
+        Returns (node_index, tensor_index) of the i-th input of
+        the first call of a layer (see 'inbound_nodes').
+    '''
+    nodes = serial.get('inbound_nodes')
+    if nodes and i < len(nodes[0]) and nodes[0][i][0] == serial['input'][i]:
+        return nodes[0][i][1], nodes[0][i][2]
+    return 0, 0
+
+def _node_refs(serial):
+    '''
+        Returns the names referred to by the later calls of a
+        shared layer (see 'inbound_nodes'), its first call
+        follows 'input'.
+    '''
+    return [ref[0] for node in serial.get('inbound_nodes', [])[1:] for ref in node]
+
+def _content(serial):
+    '''
+        Hash of everything in a serial except its name and the
+        names of its inputs.
+    '''
+    return _digest(serial['class_name'], _strip_names(serial['config']), serial['input_shape'], serial['output_shape'])
+
+def _nodes_content(name, serial, contents):
+    '''
+        Hash of the 'inbound_nodes' of a shared layer, where
+        input names are replaced by the content hash of their
+        layer ('input' for inputs that are not in 'contents').
+    '''
+    return _digest([[('self' if ref[0] == name else contents.get(ref[0], 'input'),)+tuple(ref[1:]) for ref in node]
+                    for node in serial['inbound_nodes']])
+
+def fingerprint(identifier):
+    '''
+        This function is used to compute a canonical hash of an
+        advanced serial or series. The hash covers 'class_name',
+        'config', the input topology and the shapes, and is
+        independent of layer names and of the order of the series.
+        
+        Each layer is hashed with the hashes of its producers
+        (Merkle style); inputs that are not part of the series
+        are hashed by their shape and the layers that consume
+        them. The series hash is the hash of the sorted hashes
+        of its layers and inputs. The 'inbound_nodes' of shared
+        layers are hashed with the contents of the layers they
+        refer to.
+        
+        returns str (hex digest)
+    '''
+    if _ADVANCED_KEYS.issubset(identifier): #advanced serial
+        if 'inbound_nodes' in identifier:
+            return _digest(_content(identifier), _nodes_content(identifier['config'].get('name'), identifier, {}))
+        return _digest(_content(identifier))
+    
+    series = identifier
+    contents = dict((name, _content(serial)) for name, serial in series.items())
+    
+    shared = dict((name, _nodes_content(name, serial, contents)) for name, serial in series.items() if 'inbound_nodes' in serial)
+    for name, nodes in shared.items():
+        contents[name] = _digest(contents[name], nodes)
+    
+    external = {}
+    for name, serial in series.items():
+        for i, (input_name, shape) in enumerate(zip(serial['input'], _input_shapes(serial))):
+            if not input_name in series:
+                external.setdefault(input_name, [shape]).append((contents[name], i))
+    
+    hashes = dict((name, _digest('input', value[0], sorted(value[1:]))) for name, value in external.items())
+    
+    for name in series:
+        stack = [name]
+        visiting = set()
+        
+        while stack:
+            current = stack[-1]
+            
+            if current in hashes:
+                stack.pop()
+                continue
+            
+            missing = [input_name for input_name in series[current]['input'] if not input_name in hashes]
+            
+            if missing:
+                if current in visiting:
+                    raise ValueError("Cycle detected at '{}'.".format(current))
+                visiting.add(current)
+                stack.extend(missing)
+            else:
+                hashes[current] = _digest(contents[current], [hashes[input_name] for input_name in series[current]['input']])
+                stack.pop()
+    
+    return _digest(sorted(hashes.values()))
+
+class DependencyIndex():
+    '''
+    Description:
+        Is a class used to index the dependencies between the
+        layers of an advanced series through their 'input'
+        names. The index is built in linear time and can be
+        reused by other tools to query producers and consumers.
+    
+    Attributes:
+        producers: #dict
+            {'name': [names of the layers in the series that
+            feed 'name']} (in input order, without duplicates).
+        
+        consumers: #dict
+            {'name': [names of the layers in the series fed by
+            'name']}. Also lists the consumers of inputs that
+            are not part of the series.
+        
+        inputs: #list
+            Names of the inputs that are not part of the series
+            (assumed to be Input layers).
+        
+        node_consumers: #dict
+            {'name': [names of the shared layers whose later
+            calls (see 'inbound_nodes') take 'name' as input]}.
+            These edges are not part of the order of the series.
+    '''
+    
+    def __init__(self, series):
+        self.series = series
+        self.producers = {}
+        self.consumers = {}
+        self.node_consumers = {}
+        self.inputs = []
+        
+        for name in series:
+            self.consumers[name] = []
+        
+        for name, serial in series.items():
+            producers = []
+            seen = set()
+            
+            for input_name in serial['input']:
+                if input_name in seen:
+                    continue
+                seen.add(input_name)
+                
+                if input_name in series:
+                    producers.append(input_name)
+                elif not input_name in self.consumers:
+                    self.consumers[input_name] = []
+                    self.inputs.append(input_name)
+                
+                self.consumers[input_name].append(name)
+            
+            self.producers[name] = producers
+            
+            for input_name in set(_node_refs(serial)):
+                self.node_consumers.setdefault(input_name, []).append(name)
+    
+    def order(self):
+        '''
+            Returns the names of the series in a stable
+            topological order: a depth first walk over the order
+            of the series that places the producers of each layer
+            right before it when they come later. A series that
+            is already in topological order is returned as is.
+            Raises a ValueError if the series contains a cycle.
+            
+            returns [names]
+        '''
+        order = []
+        state = {} #name: False while visited, True once placed
+        
+        for root in self.series:
+            if root in state:
+                continue
+            
+            stack = [(root, iter(self.producers[root]))]
+            state[root] = False
+            
+            while stack:
+                name, producers = stack[-1]
+                
+                for producer in producers:
+                    if not producer in state:
+                        state[producer] = False
+                        stack.append((producer, iter(self.producers[producer])))
+                        break
+                    elif state[producer] is False:
+                        cycle = [name for name, _ in stack[[item[0] for item in stack].index(producer):]]
+                        raise ValueError("Cycle detected between the layers {}.".format(cycle))
+                else:
+                    stack.pop()
+                    state[name] = True
+                    order.append(name)
+        
+        return order
+    
+    def levels(self):
+        '''
+            Returns the names of the series grouped by dependency
+            level: layers of a level only depend on layers of the
+            previous levels (or on inputs). Raises a ValueError if
+            the series contains a cycle.
+            
+            returns [[names]]
+        '''
+        indegree = dict((name, len(producers)) for name, producers in self.producers.items())
+        level = [name for name in self.series if indegree[name] == 0]
+        levels = []
+        count = 0
+        
+        while level:
+            levels.append(level)
+            count += len(level)
+            
+            next_level = []
+            for name in level:
+                for consumer in self.consumers[name]:
+                    indegree[consumer] -= 1
+                    if indegree[consumer] == 0:
+                        next_level.append(consumer)
+            level = next_level
+        
+        if count != len(self.series):
+            cycle = [name for name in self.series if indegree[name] > 0]
+            raise ValueError("Cycle detected between the layers {}.".format(cycle))
+        
+        return levels
+    
+    def upstream(self, names):
+        '''
+            Returns the names of the layers of the series that
+            the given layers (included) depend on.
+            
+            returns set
+        '''
+        return self._walk(names, self.producers)
+    
+    def downstream(self, names):
+        '''
+            Returns the names of the layers of the series that
+            depend on the given layers or inputs (included).
+            
+            returns set
+        '''
+        return self._walk(names, self.consumers)
+    
+    def downstream_order(self, names):
+        '''
+            Returns the layers downstream of the given layers or
+            inputs (included) in topological order. Only that
+            subgraph is visited. Raises a ValueError if it
+            contains a cycle.
+            
+            returns [names]
+        '''
+        subgraph = self.downstream(names)
+        indegree = dict((name, sum(1 for producer in self.producers[name] if producer in subgraph)) for name in subgraph if name in self.series)
+        ready = deque(name for name in indegree if indegree[name] == 0)
+        order = []
+        
+        while ready:
+            name = ready.popleft()
+            order.append(name)
+            
+            for consumer in self.consumers[name]:
+                indegree[consumer] -= 1
+                if indegree[consumer] == 0:
+                    ready.append(consumer)
+        
+        if len(order) != len(indegree):
+            cycle = [name for name in indegree if indegree[name] > 0]
+            raise ValueError("Cycle detected between the layers {}.".format(cycle))
+        
+        return order
+    
+    def _walk(self, names, edges):
+        visited = set()
+        stack = list(names)
+        
+        while stack:
+            name = stack.pop()
+            
+            if not name in visited:
+                visited.add(name)
+                stack.extend(edges.get(name, ()))
+        
+        return visited
+
+def topological_sort(series, index=None):
+    '''
+        This function is used to reorder an advanced series so
+        that every layer comes after the layers it takes as
+        input. Layers that already come after their inputs
+        keep their order (see DependencyIndex.order). Raises a
+        ValueError if the series contains a cycle.
+        
+        returns dict (advanced series)
+    '''
+    if index is None:
+        index = DependencyIndex(series)
+    
+    return dict((name, series[name]) for name in index.order())
+
+def extract(series, inputs=[], outputs=[]):
+    '''
+        This function is used to copy the subgraph of an
+        advanced series that lies between the layers named in
+        'inputs' (excluded) and 'outputs' (included). The
+        series is walked backwards from 'outputs' through the
+        'input' names of each layer and the walk stops at
+        'inputs', so only the subgraph is visited. Paths that
+        are not cut by 'inputs' extend to the inputs of the
+        series. Layers that feed the later calls of a shared
+        layer (see 'inbound_nodes') are extracted with it.
+        
+        The layers of the subgraph keep their names, and the
+        layers named in 'inputs' (or the inputs of the series)
+        become the inputs of the subgraph (see
+        DependencyIndex.inputs). Raises a KeyError if an output
+        is not part of the series and a ValueError if the
+        subgraph contains a cycle.
+        
+        returns dict (advanced series, in topological order)
+    '''
+    inputs = set(inputs)
+    subgraph = {}
+    done = set()
+    visiting = set()
+    
+    for output in outputs:
+        if not output in series:
+            raise KeyError("'{}' is not a layer of the series.".format(output))
+    
+    roots = deque(outputs)
+    
+    while roots:
+        stack = [roots.popleft()]
+        
+        while stack: #iterative post-order, producers are added first
+            name = stack[-1]
+            
+            if name in done:
+                stack.pop()
+                continue
+            
+            missing = [input_name for input_name in series[name]['input']
+                       if input_name in series and not input_name in inputs and not input_name in done]
+            
+            if missing:
+                if name in visiting:
+                    raise ValueError("Cycle detected at '{}'.".format(name))
+                visiting.add(name)
+                stack.extend(missing)
+            else:
+                subgraph[name] = deepcopy(series[name])
+                done.add(name)
+                stack.pop()
+                
+                #layers fed to the later calls of a shared layer
+                roots.extend(ref for ref in _node_refs(series[name]) if ref in series and not ref in inputs and not ref in done)
+    
+    return subgraph
+
+def _unique_name(name, *taken):
+    i = 0
+    new = name
+    while any(new in names for names in taken):
+        i += 1
+        new = '{}_{}'.format(name, i)
+    return new
+
+def splice(target, subgraph, at={}, custom_objects=None, fallback=True):
+    '''
+        This function is used to insert the layers of an
+        advanced series 'subgraph' (e.g. from extract) into the
+        advanced series 'target'. 'target' is updated in place;
+        'subgraph' is not modified.
+        
+        *at:        Dict of {'subgraph input': 'target layer'},
+                    used to connect the inputs of the subgraph to
+                    layers of the target. Inputs that are not
+                    listed keep their name (they are connected to
+                    the layer of the same name in the target, or
+                    remain inputs of the series).
+        
+        Layers whose name is already used in the target are
+        renamed with a '_n' suffix (in 'input', 'inbound_nodes'
+        and config['name']). The 'input_shape' (and the shapes
+        in 'inbound_nodes') of the layers fed by the target is
+        set to the 'output_shape' of their new producers, and
+        output shapes are recomputed downstream within the
+        subgraph (see KASD.shapes.propagate). Only the subgraph
+        is visited, and the target is left unchanged if the
+        shapes cannot be propagated.
+        
+        returns dict ({'subgraph name': 'target name'})
+    '''
+    from .shapes import propagate
+    
+    #names of the target layers/inputs the subgraph connects to, and the new names
+    taken = set(at.get(input_name, input_name) for serial in subgraph.values()
+                for input_name in list(serial['input'])+_node_refs(serial) if not input_name in subgraph)
+    
+    names = {}
+    for name in subgraph:
+        names[name] = _unique_name(name, target, taken)
+        taken.add(names[name])
+    
+    inserted = {}
+    changed = []
+    
+    for name, serial in subgraph.items():
+        serial = deepcopy(serial)
+        serial['config']['name'] = names[name]
+        serial['input'] = list(serial['input'])
+        
+        single = len(serial['input']) == 1
+        input_shapes = _input_shapes(serial)
+        
+        for i, input_name in enumerate(serial['input']):
+            if input_name in names:
+                serial['input'][i] = names[input_name]
+                continue
+            
+            node_index, tensor_index = _first_ref(subgraph[name], i)
+            input_name = serial['input'][i] = at.get(input_name, input_name)
+            
+            if input_name in target and node_index == 0:
+                shape = _output_ref_shape(target[input_name]['output_shape'], tensor_index)
+                
+                if tuple(input_shapes[i]) != tuple(shape):
+                    input_shapes[i] = tuple(shape)
+                    changed.append(names[name])
+        
+        serial['input_shape'] = input_shapes[0] if single else input_shapes
+        
+        if 'inbound_nodes' in serial:
+            nodes = serial['inbound_nodes']
+            
+            for k, node in enumerate(nodes):
+                for j, ref in enumerate(node):
+                    if k == 0 and j < len(serial['input']): #first call follows 'input'
+                        node[j] = [serial['input'][j], ref[1], ref[2], input_shapes[j]]
+                    elif ref[0] in names:
+                        node[j] = [names[ref[0]]]+list(ref[1:])
+                    else:
+                        input_name = at.get(ref[0], ref[0])
+                        shape = ref[3]
+                        
+                        if input_name in target and ref[1] == 0:
+                            shape = tuple(_output_ref_shape(target[input_name]['output_shape'], ref[2]))
+                            if tuple(ref[3]) != shape:
+                                changed.append(names[name])
+                        
+                        node[j] = [input_name, ref[1], ref[2], shape]
+        
+        inserted[names[name]] = serial
+    
+    if changed: #before merging, so a failure leaves the target untouched
+        propagate(inserted, changed=changed, custom_objects=custom_objects, fallback=fallback)
+    
+    target.update(inserted)
+    
+    return names
+
+def _same(a, b):
+    '''
+        Equality that does not distinguish tuples from lists
+        (e.g. shapes before and after a json round trip).
+    '''
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    elif isinstance(a, dict) and isinstance(b, dict):
+        return len(a) == len(b) and all(key in b and _same(value, b[key]) for key, value in a.items())
+    else:
+        return a == b and isinstance(a, bool) == isinstance(b, bool)
+
+def _diff_dict(a, b, skip=None):
+    '''
+        Returns {'set': {key: value}, 'unset': [keys]} of the
+        keys of 'b' that differ from 'a' and the keys only in
+        'a', ignoring 'skip'. Returns {} if they are the same.
+    '''
+    changes = {'set': {}, 'unset': []}
+    
+    for key, value in b.items():
+        if key != skip and (not key in a or not _same(a[key], value)):
+            changes['set'][key] = value
+    for key in a:
+        if key != skip and not key in b:
+            changes['unset'].append(key)
+    
+    return changes if changes['set'] or changes['unset'] else {}
+
+def _patch_dict(a, changes):
+    '''
+        Returns a copy of 'a' with the changes of _diff_dict
+        applied.
+    '''
+    a = dict(a)
+    for key in changes.get('unset', ()):
+        a.pop(key, None)
+    a.update(deepcopy(changes.get('set', {})))
+    return a
+
+def diff(a, b):
+    '''
+        This function is used to compute the edit script that
+        turns the advanced series 'a' into 'b'. Layers are
+        matched by name, so the script is computed in linear
+        time. The script is a dict of:
+            'added':    {'name': advanced serial} of the layers
+                        only in 'b'.
+            'removed':  [names] of the layers only in 'a'.
+            'changed':  {'name': delta} of the layers in both
+                        that differ. A delta holds {'set': {key:
+                        value}, 'unset': [keys]} for the top
+                        level keys of the serial that were
+                        changed/added or removed (e.g.
+                        'class_name', 'input', 'weights',
+                        'inbound_nodes', 'compact'), and 'config'
+                        in the same form for its config
+                        fields.
+        
+        Values are taken from 'b' without copying, so the
+        script can be serialized (e.g. with json) to store a
+        series as a delta of another.
+        
+        returns dict
+    '''
+    patch = {'added': {}, 'removed': [], 'changed': {}}
+    
+    for name in a:
+        if not name in b:
+            patch['removed'].append(name)
+    
+    for name, serial in b.items():
+        if not name in a:
+            patch['added'][name] = serial
+            continue
+        
+        old = a[name]
+        delta = _diff_dict(old, serial, skip='config')
+        config = _diff_dict(old['config'], serial['config'])
+        
+        if config:
+            delta['config'] = config
+        
+        if delta:
+            patch['changed'][name] = delta
+    
+    return patch
+
+def apply_patch(series, patch):
+    '''
+        This function is used to replay an edit script from
+        diff on the advanced series 'series', in linear time.
+        'series' is not modified; the layers that are not
+        changed by the script are shared with the returned
+        series. Added layers are placed after the others (see
+        topological_sort). Raises a KeyError if a removed or
+        changed layer is not part of the series.
+        
+        returns dict (advanced series)
+    '''
+    removed = set(patch.get('removed', ()))
+    changed = patch.get('changed', {})
+    
+    for name in list(removed)+list(changed):
+        if not name in series:
+            raise KeyError("'{}' is not a layer of the series.".format(name))
+    
+    result = {}
+    
+    for name, serial in series.items():
+        if name in removed:
+            continue
+        
+        if name in changed:
+            delta = changed[name]
+            serial = _patch_dict(serial, delta)
+            
+            if 'config' in delta:
+                serial['config'] = _patch_dict(serial['config'], delta['config'])
+        
+        result[name] = serial
+    
+    for name, serial in patch.get('added', {}).items():
+        result[name] = deepcopy(serial)
+    
+    return result
@@ -128,12 +128,16 @@ FYI:
         ConvLSTM2DCell.bias_initializer
 '''
 
-from keras.initializers import serialize, deserialize as _deserialize
+from . import _backend, _on_backend_load, _deserialize_object
+
 import six
 
+def serialize(initializer):
+    return _backend('initializers').serialize(initializer)
+
 def deserialize(identifier, custom_objects=None):
     try:
-        return _deserialize(identifier, custom_objects=custom_objects)
+        return _deserialize_object('initializers', identifier, custom_objects=custom_objects)
     except:
         raise AttributeError("Use the initializers.custom decorator for custom object support.")
 
@@ -168,8 +172,7 @@ initializers = _Initializers(_GLOBAL_LABELS['initializers'])
 custom = initializers.custom
 label = initializers.label
 
-from keras import initializers as _initializers
+[initializers.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value]
 
-_dir = dir(_initializers)
-[initializers.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value if name in _dir] #ensures native keras objects
+_on_backend_load(lambda: initializers._prune_labels(dir(_backend('initializers')))) #ensures native keras objects
 
@@ -24,14 +24,14 @@ Customization:
         @layers.custom
         class layer(...):
             pass
-         
+        
         or
         
         @label('new')
         @custom
         class layer(...):
             pass
-            
+        
         or
         
         @layers
@@ -50,52 +50,552 @@ Customization:
         or
         
         label('conv', func=keras.layers.Conv1D)
-    
+
 Functionality:
     *is_advanced_serial : (func) Used to identify advanced serials.
     *is_advanced_series : (func) Used to identity advanced series.
+    *classify           : (func) Used to identify serials, series and native identifiers in one pass.
+    *plan_patches       : (func) Used to plan input error patches of an advanced series without building it.
     *deserialize        : (func) Used to deserialize layers.
     *serialize          : (func) Used to serialize native and advanced series/serials of layers.
+    *IncrementalSerializer : (class) Used to re-serialize only the changed layers of a series.
+    *iter_serialize     : (func) Used to stream (name, advanced serial) pairs while walking the graph of outputs.
+    *serialize_graph    : (func) Used to serialize every layer that outputs depend on.
+    *serialize_model    : (func) Used to serialize a keras Model.
+    *iter_deserialize   : (func) Used to stream tensors from (name, advanced serial) pairs.
+    *deserialize_many   : (func) Used to deserialize many advanced series into models in worker processes.
+    *SeriesCache        : (class) Used to reuse built series that are structurally identical.
+    *clear_session      : (func) Used to clear the keras session and every SeriesCache.
+    *fingerprint        : (func) See KASD.graph.fingerprint.
+    *topological_sort   : (func) See KASD.graph.topological_sort.
+    *DependencyIndex    : (class) See KASD.graph.DependencyIndex.
+    *extract            : (func) See KASD.graph.extract.
+    *splice             : (func) See KASD.graph.splice.
+    *diff               : (func) See KASD.graph.diff.
+    *apply_patch        : (func) See KASD.graph.apply_patch.
+    *dump               : (func) See KASD.storage.dump.
+    *load               : (func) See KASD.storage.load.
+    *WeightStore        : (class) See KASD.storage.WeightStore.
     *update             : (func) Used to update an advanced serial to accomodate attribute changes.
+    *propagate          : (func) See KASD.shapes.propagate.
+    *estimate           : (func) See KASD.costs.estimate.
     *get                : (func) Used to identify layers and tensors.
     *layers             : (class) Used to categorise keras layers. 
     *custom             : (@func) Used to identify custom keras layers.
     *label              : (@func) USed to label custom/native keras layers.
 '''
-try:
-    from keras.backend import is_tensor
-except:
-    def is_tensor(obj):
-        return hasattr(obj, '_keras_history') and hasattr(obj._keras_history[0], 'built') and obj._keras_history[0].built is True
+from . import _backend, _on_backend_load, _deserialize_object, _resolve
 
-from keras.layers import serialize as _serialize, deserialize as _deserialize
-from keras.layers import Input, Flatten, Dense, Reshape
+from .shapes import compute_output_shape, propagate
+from .costs import estimate
 
+from .graph import _same, _output_ref_shape, _first_ref, fingerprint, topological_sort, DependencyIndex, extract, splice, diff, apply_patch
+from .storage import dump, load, WeightStore
+
+from collections import namedtuple, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from copy import deepcopy
 import numpy as np
+import hashlib
+import weakref
+import inspect
+import json
+
+#keras is loaded on first use, see KASD._backend
+
+def is_tensor(obj):
+    backend = _backend('backend')
+    
+    if hasattr(backend, 'is_tensor'):
+        return backend.is_tensor(obj)
+    else:
+        return hasattr(obj, '_keras_history') and hasattr(obj._keras_history[0], 'built') and obj._keras_history[0].built is True
+
+def _serialize(layer):
+    return _backend('layers').serialize(layer)
+
+def _deserialize(config, custom_objects=None):
+    return _deserialize_object('layers', config, custom_objects=custom_objects)
+
+SERIAL = 'serial'
+SERIES = 'series'
+NATIVE = 'native'
+
+_ADVANCED_KEYS = frozenset(('config', 'class_name', 'input', 'input_shape', 'output_shape'))
+
+#kind: SERIAL, SERIES or NATIVE
+#key: first key of a dict identifier whose value is not an advanced serial, else None
+Classification = namedtuple('Classification', ('kind', 'key'))
 
 def is_advanced_serial(identifier):
-    return isinstance(identifier, dict) and (
-            'config' in identifier and
-            'class_name' in identifier and
-            'input' in identifier and
-            'input_shape' in identifier and
-            'output_shape' in identifier)
+    return isinstance(identifier, dict) and _ADVANCED_KEYS.issubset(identifier)
 
 def is_advanced_series(identifier):
+    return classify(identifier).kind == SERIES
+
+def classify(identifier):
+    '''
+        Classifies 'identifier' as an advanced serial, an
+        advanced series or a native identifier in a single
+        pass. For dict identifiers that are neither, the key
+        of the first value that is not an advanced serial is
+        reported.
+        
+        returns Classification(kind, key)
+    '''
     if isinstance(identifier, dict):
-        is_true = True
+        if _ADVANCED_KEYS.issubset(identifier):
+            return Classification(SERIAL, None)
         
-        for value in identifier.values():
-            if not is_advanced_serial(value):
-                is_true = False
-                break
+        for key, value in identifier.items():
+            if not (isinstance(value, dict) and _ADVANCED_KEYS.issubset(value)):
+                return Classification(NATIVE, key)
         
-        return is_true
+        return Classification(SERIES, None)
     else:
-        return False
+        return Classification(NATIVE, None)
+
+def _copy_config(config):
+    '''
+        Copies only the parts of a layer config that keras
+        mutates during deserialization: the config dict itself
+        and the nested serials ({'class_name', 'config'}) it
+        holds (e.g. the 'layer' of a Wrapper, the 'cell' of an
+        RNN or the 'cells' of StackedRNNCells), which are
+        popped from their parent by from_config. All other
+        values are shared with the original config.
+        
+        returns dict
+    '''
+    def copy_value(value):
+        if isinstance(value, dict) and 'class_name' in value and isinstance(value.get('config'), dict):
+            value = dict(value)
+            value['config'] = _copy_config(value['config'])
+        elif isinstance(value, list) and any(isinstance(item, dict) for item in value):
+            value = [copy_value(item) for item in value]
+        
+        return value
+    
+    return {key: copy_value(value) for key, value in config.items()}
+
+_DEFAULT_CONFIGS = {} #class: (required keys, default config or None)
+
+def _required_keys(cls):
+    '''
+        Returns the names of the arguments of cls.__init__ that
+        have no default value, or None if its signature cannot
+        be inspected.
+    '''
+    try:
+        parameters = inspect.signature(cls.__init__).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    
+    return [p.name for p in parameters if p.name != 'self' and p.default is p.empty and p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)]
+
+def _default_config(cls, config):
+    '''
+        Returns (required keys, default config) of a layer
+        class, where the default config holds the non-required
+        fields of the config of a layer constructed from
+        placeholder required arguments (those of the first
+        'config' seen). Results are cached per class, so each
+        is only computed once. The default config is None if
+        the layer cannot be constructed that way (e.g. a
+        required argument is not part of its config). The
+        defaults of non-required fields are assumed not to
+        depend on the required arguments.
+    '''
+    if not cls in _DEFAULT_CONFIGS:
+        required = _required_keys(cls)
+        
+        if required is None or any(not key in config for key in required):
+            return required, None
+        
+        required_config = deepcopy(dict((k, config[k]) for k in required))
+        required_config['name'] = 'kasd_defaults' #a given name does not advance keras' layer name counters
+        
+        try:
+            defaults = dict((key, value) for key, value in cls.from_config(required_config).get_config().items()
+                            if key != 'name' and not key in required)
+        except Exception:
+            defaults = None
+        
+        _DEFAULT_CONFIGS[cls] = (required, defaults)
+    
+    return _DEFAULT_CONFIGS[cls]
+
+def _compact_config(cls, config):
+    '''
+        Returns 'config' without the non-required fields that
+        are equal to the defaults of 'cls' (see
+        _default_config). 'name' and the required arguments are
+        always kept. Returns None if the defaults of 'cls' are
+        unknown.
+    '''
+    required, defaults = _default_config(cls, config)
+    
+    if defaults is None:
+        return None
+    
+    return dict((key, value) for key, value in config.items() if not (key in defaults and _same(value, defaults[key])))
+
+def _native_serial(adv_serial, custom_objects, copy_config):
+    '''
+        Returns the native serial ({'class_name', 'config'}) of
+        an advanced serial, with the defaults of a compact
+        config (see serialize) restored.
+    '''
+    config = adv_serial['config']
+    
+    if adv_serial.get('compact'):
+        resolved = _resolve('layers', adv_serial['class_name'], custom_objects)
+        defaults = None if resolved is None else _default_config(resolved[0], config)[1]
+        
+        if defaults is None:
+            raise ValueError("Cannot restore the compact config of '{}', the defaults of '{}' are unknown.".format(config.get('name'), adv_serial['class_name']))
+        
+        config = dict(defaults, **config)
+    
+    return {'class_name': adv_serial['class_name'], 'config': copy_config(config)}
+
+def _patch_name(input_names, class_name):
+    if not isinstance(input_names, (list, tuple)):
+        input_names = [input_names]
+    
+    return "-".join(input_names)+"/{}/patch".format(class_name)
+
+def plan_patches(identifier):
+    '''
+        This function is used to statically plan the input
+        error patches of an advanced series. The recorded
+        'input_shape' of each layer is compared against the
+        'output_shape' of its producers (inputs that are not
+        part of the series are assumed to be Input layers of
+        the recorded shape). For every mismatch, patch layers
+        (Flatten, Dense and/or Reshape) are planned as advanced
+        serials and the consumer is rewired to the last patch.
+        No keras object is built.
+        
+        A patch report entry is a dict with:
+            'layer':    name of the patched layer.
+            'input':    name of the mismatched producer.
+            'expected': recorded input shape of the layer.
+            'received': output shape of the producer.
+            'patches':  names of the planned patch layers, or
+                        None if the mismatch cannot be patched
+                        statically (undefined dimensions).
+        
+        returns (advanced series, [patch report entries])
+    '''
+    def prod(shape):
+        size = 1
+        for dim in shape:
+            size *= dim
+        return size
+    
+    def add_patch(producer, class_name, config, output_shape):
+        name = _patch_name(producer, class_name)
+        patch = {'class_name': class_name, 'config': dict(config, name=name), 'input': [producer],
+                 'input_shape': output_shapes[producer], 'output_shape': output_shape}
+        
+        i = 0
+        while name in planned and planned[name] != patch:
+            i += 1
+            patch['config']['name'] = name = '{}_{}'.format(_patch_name(producer, class_name), i)
+        
+        planned[name] = patch
+        output_shapes[name] = output_shape
+        return name
+    
+    planned = {}
+    output_shapes = {}
+    report = []
+    
+    for key, value in identifier.items():
+        input_names = list(value['input'])
+        single = len(input_names) == 1
+        
+        for i, input_name in enumerate(input_names):
+            intended = tuple(value['input_shape'] if single else value['input_shape'][i])
+            
+            if not input_name in output_shapes: #assumed Input layer
+                output_shapes[input_name] = intended
+                continue
+            
+            node_index, tensor_index = _first_ref(value, i)
+            if node_index != 0: #later calls of shared layers are not recorded
+                continue
+            
+            current = tuple(_output_ref_shape(output_shapes[input_name], tensor_index))
+            if intended[1:] == current[1:]: #ignore batch_size
+                continue
+            
+            entry = {'layer': key, 'input': input_name, 'expected': intended, 'received': current, 'patches': None}
+            report.append(entry)
+            
+            if None in intended[1:] or None in current[1:]:
+                continue
+            
+            patches = []
+            producer = input_name
+            batch_size = current[0]
+            
+            if len(current) > 2: #flatten OG shape if >= 3D tensor
+                producer = add_patch(producer, 'Flatten', {}, (batch_size, prod(current[1:])))
+                patches.append(producer)
+            
+            if prod(intended[1:]) != prod(output_shapes[producer][1:]):
+                producer = add_patch(producer, 'Dense', {'units': prod(intended[1:])}, (batch_size, prod(intended[1:])))
+                patches.append(producer)
+            
+            if len(intended) > 2: #correct shape if intended shape >= 3D tensor
+                producer = add_patch(producer, 'Reshape', {'target_shape': intended[1:]}, (batch_size,)+intended[1:])
+                patches.append(producer)
+            
+            input_names[i] = producer
+            entry['patches'] = patches
+        
+        if input_names != value['input']:
+            value = dict(value, input=input_names)
+            
+            if 'inbound_nodes' in value: #the first call follows 'input'
+                node = [[producer, 0, 0, ref[3]] if producer != ref[0] else ref for producer, ref in zip(input_names, value['inbound_nodes'][0])]
+                value['inbound_nodes'] = [node]+list(value['inbound_nodes'][1:])
+        
+        planned[key] = value
+        output_shapes[key] = value['output_shape']
+    
+    return planned, report
+
+_CACHES = weakref.WeakSet() #every SeriesCache, see clear_session
 
-def deserialize(identifier, custom_objects=None, catch_input_errors=False):
+def _graph():
+    '''
+        Returns the current keras graph, or None if the backend
+        does not expose it.
+    '''
+    backend = _backend('backend')
+    
+    if hasattr(backend, 'get_graph'):
+        return backend.get_graph()
+    elif hasattr(getattr(backend, 'tf', None), 'get_default_graph'): #tensorflow backend of keras < 2.3
+        return backend.tf.get_default_graph()
+    else:
+        return None
+
+def clear_session():
+    '''
+        This function is used to clear the keras session (see
+        keras.backend.clear_session) together with the entries
+        of every SeriesCache, whose tensors belong to the
+        cleared graph.
+        
+        returns None
+    '''
+    backend = _backend('backend')
+    
+    if hasattr(backend, 'clear_session'):
+        backend.clear_session()
+    
+    for cache in list(_CACHES):
+        cache.clear()
+
+class SeriesCache():
+    '''
+    Description:
+        Is a bounded LRU cache of deserialized advanced series,
+        keyed by their canonical fingerprint (see
+        KASD.graph.fingerprint). When passed to deserialize,
+        structurally identical series (including series that
+        only differ in layer names or order) are built once and
+        the previously built list of tensors is returned.
+        
+        Returned tensors are shared between hits: every hit
+        returns the same layers (and weights) as the series that
+        was first built, including its layer names. Train or
+        modify them only if sharing is intended.
+        
+        Entries are tied to the keras graph they were built in.
+        An entry built in another graph (e.g. before
+        keras.backend.clear_session) is dropped and counted as a
+        miss. Use clear_session to clear the keras session and
+        every SeriesCache at once.
+    
+    Attributes:
+        maxsize: #int
+            Maximum number of built series kept in the cache.
+    '''
+    
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._entries = OrderedDict() #key: (graph, value)
+        self.hits = 0
+        self.misses = 0
+        
+        _CACHES.add(self)
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, key):
+        return key in self._entries
+    
+    def get(self, key):
+        if key in self._entries:
+            graph, value = self._entries[key]
+            
+            if graph is _graph():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            
+            del self._entries[key] #built in a cleared graph
+        
+        self.misses += 1
+        return None
+    
+    def put(self, key, value):
+        self._entries[key] = (_graph(), value)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+
+def _get_input(input_name, input_shape, series):
+    '''
+        Returns the tensor named 'input_name' in 'series', or
+        creates (and adds) an Input placeholder for it.
+    '''
+    if input_name in series:
+        return series[input_name]
+    else:
+        new = _backend('layers').Input(batch_shape=input_shape, name=input_name)
+        series.update({input_name: new})
+        return new
+
+def _construct(adv_serial, custom_objects, copy_config):
+    '''
+        Deserializes the layer of an advanced serial without
+        calling it.
+        
+        returns layer
+    '''
+    return _deserialize(_native_serial(adv_serial, custom_objects, copy_config), custom_objects=custom_objects)
+
+def _connect(cls, adv_serial, series):
+    '''
+        Calls a layer on its inputs from 'series' (see
+        _get_input).
+        
+        returns tensor
+    '''
+    if len(adv_serial['input']) == 1:
+        _input = _get_input(adv_serial['input'][0], adv_serial['input_shape'], series)
+    else:
+        _input = [_get_input(adv_serial['input'][i], adv_serial['input_shape'][i], series) for i in range(len(adv_serial['input']))]
+    
+    return cls(_input)
+
+def _set_weights(layer, adv_serial, weights):
+    '''
+        Assigns the weights referenced by an advanced serial
+        to its built layer, reading them from the WeightStore
+        'weights' without copying.
+    '''
+    if not weights is None and 'weights' in adv_serial:
+        layer.set_weights([weights.get(reference) for reference in adv_serial['weights']])
+
+def _serial_refs(adv_serial):
+    '''
+        Returns the inbound nodes of an advanced serial as lists
+        of (input name, node_index, tensor_index, input_shape).
+        The first node follows 'input' and 'input_shape', so
+        inputs rewired by plan_patches are taken into account.
+    '''
+    input_shapes = [adv_serial['input_shape']] if len(adv_serial['input']) == 1 else list(adv_serial['input_shape'])
+    nodes = adv_serial.get('inbound_nodes') or [[]]
+    
+    first = []
+    for i, (input_name, input_shape) in enumerate(zip(adv_serial['input'], input_shapes)):
+        ref = nodes[0][i] if i < len(nodes[0]) else None
+        first.append((input_name, ref[1], ref[2], input_shape) if ref and ref[0] == input_name else (input_name, 0, 0, input_shape))
+    
+    return [first]+[[tuple(ref) for ref in node] for node in nodes[1:]]
+
+def _build_nodes(identifier, series, custom_objects, copy_config, weights=None):
+    '''
+        Builds an advanced series whose serials may have
+        'inbound_nodes' (see serialize). Each layer is
+        constructed once and called at each of its nodes; nodes
+        are connected as soon as the nodes they take as input
+        are, so a layer can be fed by its own earlier calls.
+        The output of the first call of each layer is added to
+        'series'. Raises a ValueError if some nodes can never be
+        connected.
+    '''
+    refs = dict((name, _serial_refs(serial)) for name, serial in identifier.items())
+    
+    layers = {}
+    outputs = {} #(name, node_index): output tensor(s)
+    waiting = {} #(name, node_index): nodes that take it as input
+    missing = {}
+    ready = deque()
+    
+    for name in identifier:
+        for k, node in enumerate(refs[name]):
+            dependencies = set((ref[0], ref[1]) for ref in node if ref[0] in identifier)
+            missing[(name, k)] = len(dependencies)
+            
+            for dependency in dependencies:
+                waiting.setdefault(dependency, []).append((name, k))
+            
+            if len(dependencies) == 0:
+                ready.append((name, k))
+    
+    def get_input(ref):
+        input_name, node_index, tensor_index, input_shape = ref
+        output = outputs[(input_name, node_index)] if input_name in identifier else _get_input(input_name, input_shape, series)
+        return output[tensor_index] if isinstance(output, (list, tuple)) else output
+    
+    while ready:
+        name, k = ready.popleft()
+        
+        if not name in layers:
+            layers[name] = _construct(identifier[name], custom_objects, copy_config)
+        
+        _input = [get_input(ref) for ref in refs[name][k]]
+        output = outputs[(name, k)] = layers[name](_input[0] if len(_input) == 1 else _input)
+        
+        if k == 0:
+            series[name] = output
+            _set_weights(layers[name], identifier[name], weights)
+        
+        for node in waiting.pop((name, k), ()):
+            missing[node] -= 1
+            if missing[node] == 0:
+                ready.append(node)
+    
+    if len(outputs) != len(missing):
+        raise ValueError("Cannot connect the nodes {}.".format(sorted(node for node in missing if not node in outputs)))
+
+def _build(adv_serial, series, custom_objects, copy_config, weights=None):
+    '''
+        Deserializes an advanced serial and calls it on its
+        inputs from 'series'.
+        
+        returns tensor
+    '''
+    layer = _construct(adv_serial, custom_objects, copy_config)
+    tensor = _connect(layer, adv_serial, series)
+    _set_weights(layer, adv_serial, weights)
+    
+    return tensor
+
+def deserialize(identifier, custom_objects=None, catch_input_errors=False, classification=None, deepcopy_configs=True, cache=None, workers=None, weights=None):
     '''
         This function is used to deserialize native and
         advanced serials into built/unbuilt layers or a list
@@ -103,6 +603,10 @@ def deserialize(identifier, custom_objects=None, catch_input_errors=False):
         functionality of deserialization from
         keras.layers.deserialize.
         
+        Compact advanced serials (see serialize) get the
+        defaults of their class restored before they are
+        constructed.
+        
         *catch_input_errors:    When enabled, allows for the
                                 function to catch and patch
                                 input errors. This only occurs
@@ -111,95 +615,188 @@ def deserialize(identifier, custom_objects=None, catch_input_errors=False):
                                 shape. A converter is used which
                                 include atleast one of the following:
                                 Flatten, Dense, and Reshape layer.
+                                For advanced series, all patches are
+                                planned up front by plan_patches and
+                                only the planned graph is built.
+        
+        *classification:        Optional result of classify(identifier),
+                                used to avoid classifying the same
+                                identifier more than once.
+        
+        *deepcopy_configs:      When disabled, configs of advanced
+                                serials are treated as read-only and
+                                only the parts keras mutates are
+                                copied (see _copy_config). Input
+                                errors are then detected by comparing
+                                shapes before a layer is called,
+                                instead of calling a deepcopy of
+                                the layer and catching the exception.
+        
+        *workers:               Optional number of threads used to
+                                construct the layers of an advanced
+                                series. The series is split into
+                                dependency levels; the layers of a
+                                level are constructed concurrently
+                                (while the previous level is being
+                                connected) and tensors are connected
+                                in order on the calling thread.
+        
+        Advanced series are built in topological order (see
+        KASD.graph.topological_sort), so they do not need to be
+        ordered; a ValueError is raised if a series has a cycle.
+        
+        Advanced serials with 'inbound_nodes' (shared layers,
+        see serialize) are constructed once and called at each
+        node; series that contain them are connected node by
+        node on the calling thread ('workers' is not used).
+        
+        *cache:                 Optional SeriesCache. Advanced series
+                                that are structurally identical to a
+                                previously built series are returned
+                                from the cache instead of being rebuilt.
+                                Hits share their layers and weights
+                                (see SeriesCache). Not used when
+                                'weights' is given.
+        
+        *weights:               Optional WeightStore (see
+                                KASD.storage.WeightStore). Layers of
+                                advanced serials that have a 'weights'
+                                section (see serialize) are assigned
+                                their weights from views of the store.
         
         returns tensor/layer/[tensors]
     '''
-    def patch_name(input_names, class_name):
-        if not isinstance(input_names, (list, tuple)):
-            input_names = [input_names]
-        
-        return "-".join(input_names)+"/{}/patch".format(class_name)
-
+    patch_name = _patch_name
+    
     def get_input(input_name, input_shape, series={}):
         if input_name in series:
             return series[input_name]
         else:
-            new = Input(batch_shape=input_shape, name=input_name)
+            new = _backend('layers').Input(batch_shape=input_shape, name=input_name)
             series.update({input_name: new})
             return new
-
+    
+    def input_shapes(_input, adv_serial):
+        if not isinstance(_input, (list, tuple)):
+            _input = [_input]
+        
+        shapes = []
+        for i in range(len(_input)):
+            intended_input_shape = tuple(adv_serial['input_shape'][1:] if len(_input) == 1 else adv_serial['input_shape'][i][1:]) #ignore batch_size
+            current_input_shape = tuple(_input[i]._keras_history[0].output_shape[1:]) #ignore batch_size
+            shapes.append((intended_input_shape, current_input_shape))
+        
+        return shapes
+    
     def create_tensor(cls, _input, adv_serial):
         if catch_input_errors:
-            tensor = None
-            new_tensors = None
+            if deepcopy_configs:
+                try:
+                    return None, deepcopy(cls)(_input) #even if building tensor fails, in keras/tensorflow the layer class is still built even in exeption. Error fixed with deepcopy.
+                except:
+                    pass
+            elif all(intended == current for intended, current in input_shapes(_input, adv_serial)):
+                return None, cls(_input)
             
-            try:
-                tensor = deepcopy(cls)(_input) #even if building tensor fails, in keras/tensorflow the layer class is still built even in exeption. Error fixed with deepcopy.
-            except:
-                print("Addendum between {}({}) identified. Patching discrepency.".format(adv_serial['config']['name'], adv_serial['input'][0] if len(adv_serial['input']) == 1 else adv_serial['input']))
-                
-                if not isinstance(_input, (list, tuple)):
-                    _input = [_input]
-                
-                new_tensors = []
-                new_input = []
-                for i in range(len(_input)):
-                    intended_input_shape = tuple(adv_serial['input_shape'][1:] if len(_input) == 1 else adv_serial['input_shape'][i][1:]) #ignore batch_size
-                    current_input_shape = tuple(_input[i]._keras_history[0].output_shape[1:]) #ignore batch_size
+            print("Addendum between {}({}) identified. Patching discrepency.".format(adv_serial['config']['name'], adv_serial['input'][0] if len(adv_serial['input']) == 1 else adv_serial['input']))
+            
+            if not isinstance(_input, (list, tuple)):
+                _input = [_input]
+            
+            new_tensors = []
+            new_input = []
+            for i, (intended_input_shape, current_input_shape) in enumerate(input_shapes(_input, adv_serial)):
+                if np.all(intended_input_shape==current_input_shape):
+                    new_input.append(_input[i])
+                else:
+                    layer = _input[i]
                     
-                    if np.all(intended_input_shape==current_input_shape):
-                        new_input.append(_input[i])
-                    else:
-                        layer = _input[i]
-                        
-                        if len(current_input_shape) > 1: #flatten OG shape if >= 3D tensor
-                            layer = Flatten(name=patch_name(layer._keras_history[0].name, 'Flatten'))(layer)
-                            new_tensors.append(layer)
-                        
-                        if np.prod(intended_input_shape) != np.prod(layer.shape[1:]):
-                            layer = Dense(np.prod(intended_input_shape), name=patch_name(layer._keras_history[0].name, 'Dense'))(layer) #correct size
-                            new_tensors.append(layer)
-                        
-                        if len(intended_input_shape) > 1: #correct shape if intended shape >= 3D tensor
-                            layer = Reshape(target_shape=intended_input_shape, name=patch_name(layer._keras_history[0].name, 'Reshape'))(layer)
-                            new_tensors.append(layer)
-                        
-                        new_input.append(layer)
+                    if len(current_input_shape) > 1: #flatten OG shape if >= 3D tensor
+                        layer = _backend('layers').Flatten(name=patch_name(layer._keras_history[0].name, 'Flatten'))(layer)
+                        new_tensors.append(layer)
                     
-                if len(new_input) == 1:
-                    new_input = new_input[0]
-                
-                tensor = cls(new_input)
+                    if np.prod(intended_input_shape) != np.prod(layer.shape[1:]):
+                        layer = _backend('layers').Dense(np.prod(intended_input_shape), name=patch_name(layer._keras_history[0].name, 'Dense'))(layer) #correct size
+                        new_tensors.append(layer)
+                    
+                    if len(intended_input_shape) > 1: #correct shape if intended shape >= 3D tensor
+                        layer = _backend('layers').Reshape(target_shape=intended_input_shape, name=patch_name(layer._keras_history[0].name, 'Reshape'))(layer)
+                        new_tensors.append(layer)
+                    
+                    new_input.append(layer)
+            
+            if len(new_input) == 1:
+                new_input = new_input[0]
             
-            return new_tensors, tensor
+            return new_tensors, cls(new_input)
         else:
             return None, cls(_input)
-
-    if is_advanced_serial(identifier): #identifier is an advanced_serial
-        native_serial = {'class_name': identifier['class_name'], 'config': deepcopy(identifier['config'])}
-        cls = _deserialize(native_serial, custom_objects=custom_objects)
+    
+    copy_config = deepcopy if deepcopy_configs else _copy_config
+    
+    if classification is None:
+        classification = classify(identifier)
+    
+    if classification.kind == SERIAL and 'inbound_nodes' in identifier: #shared layer, called at each node
+        series = {}
+        _build_nodes({identifier['config']['name']: identifier}, series, custom_objects, copy_config, weights)
+        
+        return series[identifier['config']['name']]
+    elif classification.kind == SERIAL: #identifier is an advanced_serial
+        cls = _construct(identifier, custom_objects, copy_config)
         
         if len(identifier['input']) == 1:
             _input = get_input(identifier['input'][0], identifier['input_shape'])
         else:
             _input = [get_input(identifier['input'][i], identifier['input_shape'][i]) for i in range(len(identifier['input']))]
         
-        return create_tensor(cls, _input, identifier)[1]
-    elif is_advanced_series(identifier): #identifier is an advanced_series
-        series = {}
-        for key, value in identifier.items():
-            cls = _deserialize({'class_name': value['class_name'], 'config': deepcopy(value['config'])}, custom_objects=custom_objects)
+        tensor = create_tensor(cls, _input, identifier)[1]
+        _set_weights(_as_layer(tensor), identifier, weights) #the built layer may be a deepcopy of cls
+        
+        return tensor
+    elif classification.kind == SERIES: #identifier is an advanced_series
+        if not cache is None and weights is None:
+            key = (fingerprint(identifier), bool(catch_input_errors))
+            tensors = cache.get(key)
             
-            if len(value['input']) == 1:
-                _input = get_input(value['input'][0], value['input_shape'], series=series)
-            else:
-                _input = [get_input(value['input'][i], value['input_shape'][i], series=series) for i in range(len(value['input']))]
+            if tensors is None:
+                tensors = deserialize(identifier, custom_objects=custom_objects, catch_input_errors=catch_input_errors,
+                                      classification=classification, deepcopy_configs=deepcopy_configs, workers=workers)
+                cache.put(key, tensors)
             
-            new_tensors, tensor = create_tensor(cls, _input, value)
+            return tensors
+        
+        identifier = topological_sort(identifier) #inputs are built before their consumers
+        
+        if catch_input_errors:
+            identifier, report = plan_patches(identifier)
+            
+            for entry in report:
+                print("Addendum between {}({}) identified. Patching discrepency.".format(entry['layer'], entry['input']))
+        
+        series = {}
+        
+        if any('inbound_nodes' in value for value in identifier.values()):
+            _build_nodes(identifier, series, custom_objects, copy_config, weights)
+        elif workers is None or workers <= 1:
+            for key, value in identifier.items():
+                series[key] = _build(value, series, custom_objects, copy_config, weights)
+        else:
+            levels = DependencyIndex(identifier).levels()
+            _backend('layers') #loads keras on this thread, see KASD._load_backend
             
-            if not new_tensors is None:
-                [series.update({new_tensor._keras_history[0].name: new_tensor}) for new_tensor in new_tensors]
-            series[key] = tensor
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                def submit(level):
+                    return [(key, executor.submit(_construct, identifier[key], custom_objects, copy_config)) for key in level]
+                
+                futures = submit(levels[0]) if levels else []
+                for i in range(len(levels)):
+                    current, futures = futures, (submit(levels[i+1]) if i+1 < len(levels) else [])
+                    
+                    for key, future in current:
+                        layer = future.result()
+                        series[key] = _connect(layer, identifier[key], series)
+                        _set_weights(layer, identifier[key], weights)
         
         return list(series.values())
     else:
@@ -208,7 +805,183 @@ def deserialize(identifier, custom_objects=None, catch_input_errors=False):
         except:
             raise AttributeError("Use the layers.custom decorator for custom object support.")
 
-def serialize(identifier):
+def _consumer_counts(stream):
+    '''
+        Returns {name: number of layers taking 'name' as input}
+        of an iterable of (name, advanced serial) pairs.
+    '''
+    counts = {}
+    for name, value in stream:
+        for input_name in set(value['input']):
+            counts[input_name] = counts.get(input_name, 0)+1
+    return counts
+
+def iter_deserialize(stream, custom_objects=None, deepcopy_configs=True, inputs=None, weights=None, consumers=None):
+    '''
+        This function is the generator based variant of
+        deserialize for advanced series. 'stream' is any
+        iterable of (name, advanced serial) pairs, a dict or a
+        mapping such as KASD.storage.load(file). Tensors are
+        yielded as soon as their inputs are available, in the
+        same order deserialize would list them.
+        
+        Built tensors are only kept until every layer that
+        takes them as input is built, so the working set is
+        bounded by the layers in flight rather than the size of
+        the series. This requires the number of consumers of
+        each layer: it is counted in a first pass when 'stream'
+        is a mapping (a LazySeries then decodes each layer
+        twice), or can be given as 'consumers'. Otherwise every
+        tensor is kept until the stream ends.
+        
+        *inputs:    Optional names of the inputs that are not
+                    part of the stream. When given, layers whose
+                    other inputs have not been streamed yet are
+                    held back until they arrive, so the stream
+                    does not need to be in topological order;
+                    only those layers are kept in memory. When
+                    None, unknown inputs are assumed to be Input
+                    layers (the stream must be in topological
+                    order, as with deserialize).
+        
+        Layers that are still held back when the stream ends
+        are built with Input placeholders for the inputs that
+        never arrived. Raises a ValueError if the remaining
+        layers form a cycle.
+        
+        *weights:   Optional WeightStore, see deserialize.
+        
+        *consumers: Optional {name: number of layers taking
+                    'name' as input} of a stream that can only
+                    be read once.
+        
+        Serials with 'inbound_nodes' (shared layers) cannot be
+        streamed and raise a ValueError; use deserialize.
+        
+        yields tensor
+    '''
+    copy_config = deepcopy if deepcopy_configs else _copy_config
+    
+    if hasattr(stream, 'items'):
+        if consumers is None:
+            consumers = _consumer_counts(stream.items())
+        stream = stream.items()
+    
+    if not inputs is None:
+        inputs = set(inputs)
+    
+    remaining = None if consumers is None else dict(consumers)
+    series = {} #name: tensor, until its consumers are built
+    pending = {} #name: advanced serial, held back until its inputs are built
+    waiting = {} #input name: [names of pending layers]
+    
+    def release(value):
+        for input_name in set(value['input']):
+            remaining[input_name] = remaining.get(input_name, 0)-1
+            if remaining[input_name] <= 0:
+                series.pop(input_name, None)
+    
+    def build(name, value):
+        ready = deque([(name, value)])
+        
+        while ready:
+            name, value = ready.popleft()
+            
+            if 'inbound_nodes' in value:
+                raise ValueError("'{}' is a shared layer, use deserialize.".format(name))
+            
+            new = [input_name for input_name in value['input'] if not input_name in series]
+            tensor = _build(value, series, custom_objects, copy_config, weights)
+            
+            for input_name in new:
+                yield series[input_name]
+            
+            series[name] = tensor
+            yield tensor
+            
+            for built in new+[name]:
+                for consumer in waiting.pop(built, ()):
+                    if consumer in pending and all(input_name in series or input_name in inputs for input_name in pending[consumer]['input']):
+                        ready.append((consumer, pending.pop(consumer)))
+            
+            if not remaining is None:
+                release(value)
+                
+                if remaining.get(name, 0) <= 0: #not an input of any layer
+                    series.pop(name, None)
+    
+    for name, value in stream:
+        if inputs is None or all(input_name in series or input_name in inputs for input_name in value['input']):
+            for tensor in build(name, value):
+                yield tensor
+        else:
+            pending[name] = value
+            
+            for input_name in value['input']:
+                if not input_name in series and not input_name in inputs:
+                    waiting.setdefault(input_name, []).append(name)
+    
+    #inputs that never arrived are assumed to be Input layers
+    missing = set(input_name for value in pending.values() for input_name in value['input'] if not input_name in series and not input_name in pending)
+    
+    for name in [name for name, value in pending.items() if all(input_name in series or input_name in missing for input_name in value['input'])]:
+        if name in pending:
+            for tensor in build(name, pending.pop(name)):
+                yield tensor
+    
+    if pending:
+        raise ValueError("Cycle detected between the layers {}.".format(list(pending)))
+
+def _as_layer(item):
+    '''
+        Returns the built layer of a tensor, a list of tensors
+        (multiple outputs) or a layer.
+    '''
+    if isinstance(item, list): #tensors with multiple outputs have the same serial
+        item = item[0]
+    
+    if is_tensor(item):
+        item = item._keras_history[0]
+    
+    assert hasattr(item, 'built') and item.built #assert tensor is built
+    
+    return item
+
+def _input_names(layer):
+    return [input_._keras_history[0].name for input_ in layer.input] if isinstance(layer.input, list) else [layer.input._keras_history[0].name]
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+def _shape_list(shapes):
+    '''
+        Returns the shapes of a node as a list of shapes.
+    '''
+    if isinstance(shapes, (list, tuple)) and len(shapes) > 0 and all(isinstance(shape, (list, tuple)) for shape in shapes):
+        return list(shapes)
+    else:
+        return [shapes]
+
+def _inbound_refs(layer):
+    '''
+        Returns the inbound nodes of a built layer (one per call)
+        as lists of [input name, node_index, tensor_index,
+        input_shape], as in tensor._keras_history.
+    '''
+    return [[[inbound.name, node_index, tensor_index, shape] for inbound, node_index, tensor_index, shape in
+             zip(_as_list(node.inbound_layers), _as_list(node.node_indices), _as_list(node.tensor_indices), _shape_list(node.input_shapes))]
+            for node in _inbound_nodes(layer)]
+
+def _is_node_aware(refs):
+    '''
+        Whether inbound nodes cannot be described by 'input'
+        alone: the layer is shared (called more than once) or
+        an input is not the first output of its producer's
+        first call (multiple outputs or shared producer).
+    '''
+    return len(refs) > 1 or (len(refs) == 1 and any(ref[1] != 0 or ref[2] != 0 for ref in refs[0]))
+
+def serialize(identifier, weights=None, compact=False):
     '''
         This function is used to convert a list or a single
         built layer into an advanced series or serial,
@@ -222,31 +995,54 @@ def serialize(identifier):
                             as an input for the serialized layer.
                             Name is derived directly from
                             input serial['config']['name'].
-                            
+            
             'input_shape':  Describes the output shape of each
                             input.
-                            
+            
             'output_shape': Described the output shape of the
                             serialized layer.
         
+        Layers that are shared (called more than once) or that
+        take a specific output of a multi-output or shared layer
+        also get an 'inbound_nodes' component: one list per call
+        of [input name, node_index, tensor_index, input_shape].
+        'input', 'input_shape' and 'output_shape' then describe
+        the first call. deserialize constructs such layers once
+        and calls them at every node, so weights stay shared.
+        
         An advanced series is composed of advanced serials
         represented by their unique names as keys.
         
+        *weights:       Optional WeightStore (see
+                        KASD.storage.WeightStore). When given, the
+                        weights of each built layer are added to
+                        the store and advanced serials get a
+                        'weights' component: a list of references
+                        ({'offset', 'shape', 'dtype'}) in the order
+                        of layer.get_weights().
+        
+        *compact:       If enabled, the config of each advanced
+                        serial only keeps 'name', the required
+                        arguments of the layer and the fields that
+                        differ from the defaults of its class
+                        (including custom layers), and gets
+                        'compact': True. deserialize restores the
+                        dropped fields. Defaults are computed once
+                        per class and cached. Layers whose class
+                        cannot be constructed from its required
+                        arguments alone (e.g. Lambda) keep their
+                        full config. Compact and full serials of a
+                        layer have different fingerprints.
+        
         returns dict
     '''
     if isinstance(identifier, (list, tuple)):
         series = {}
         for item in identifier:
-            if isinstance(item, list): #tensors with multiple outputs have the same serial
-                item = item[0]
-            
-            if is_tensor(item):
-                item = item._keras_history[0]
-            
-            assert hasattr(item, 'built') and item.built #assert tensor is built
+            item = _as_layer(item)
             
             if item.__class__.__name__ != 'InputLayer': #Inputs are assumed when serialized as 'input' and 'input_shape' keys
-                series[item.name] = serialize(item)
+                series[item.name] = serialize(item, weights=weights, compact=compact)
         
         return series
     elif is_tensor(identifier) or (not is_tensor(identifier) and hasattr(identifier, 'built') and identifier.built):
@@ -254,29 +1050,321 @@ def serialize(identifier):
             identifier = identifier._keras_history[0]
         
         serial = _serialize(identifier)
-        serial['input'] = [input_._keras_history[0].name for input_ in identifier.input] if isinstance(identifier.input, list) else [identifier.input._keras_history[0].name]
-        serial['input_shape'] = identifier.input_shape
-        serial['output_shape'] = identifier.output_shape
+        refs = _inbound_refs(identifier)
+        
+        if _is_node_aware(refs):
+            output_shapes = _shape_list(_inbound_nodes(identifier)[0].output_shapes)
+            
+            serial['input'] = [ref[0] for ref in refs[0]]
+            serial['input_shape'] = refs[0][0][3] if len(refs[0]) == 1 else [ref[3] for ref in refs[0]]
+            serial['output_shape'] = output_shapes[0] if len(output_shapes) == 1 else output_shapes
+            serial['inbound_nodes'] = refs
+        else:
+            serial['input'] = _input_names(identifier)
+            serial['input_shape'] = identifier.input_shape
+            serial['output_shape'] = identifier.output_shape
+        
+        if not weights is None:
+            serial['weights'] = [weights.put(array) for array in identifier.get_weights()]
+        
+        if compact:
+            config = _compact_config(identifier.__class__, serial['config'])
+            
+            if not config is None:
+                serial['config'] = config
+                serial['compact'] = True
         
         return serial
     else:
         return _serialize(identifier)
 
+class IncrementalSerializer():
+    '''
+    Description:
+        Is a class used to serialize a list of built layers or
+        tensors into an advanced series (see serialize) while
+        caching the advanced serial of each layer between calls.
+        When called, only the layers that changed since the last
+        call, and their direct consumers, are re-serialized.
+        
+        A cached serial is keyed by the identity of its layer and
+        a fingerprint made of the layer's name, input names,
+        input_shape, output_shape and a digest of
+        layer.get_config(). When 'check_config' is disabled, the
+        digest is skipped and layers whose config is modified in
+        place must be marked with self.invalidate.
+        
+        Returned serials are shallow copies (serial and config
+        dicts) of the cached serials, so they can be updated in
+        place (e.g. by update or propagate) without affecting the
+        cache.
+    
+    Attributes:
+        check_config: #bool
+            Include a digest of layer.get_config() in the
+            fingerprint of each layer.
+    '''
+    
+    def __init__(self, check_config=True):
+        self.check_config = check_config
+        self._cache = {}
+        self._dirty = set()
+    
+    def _fingerprint(self, layer):
+        refs = _inbound_refs(layer)
+        
+        if _is_node_aware(refs):
+            fingerprint = (layer.name, tuple(ref[0] for node in refs for ref in node), repr(refs), repr(_inbound_nodes(layer)[0].output_shapes))
+        else:
+            fingerprint = (layer.name, tuple(_input_names(layer)), repr(layer.input_shape), repr(layer.output_shape))
+        
+        if self.check_config:
+            fingerprint += (hashlib.sha1(json.dumps(layer.get_config(), sort_keys=True, default=repr).encode('utf-8')).hexdigest(),)
+        
+        return fingerprint
+    
+    def _lookup(self, layer, fingerprint):
+        if id(layer) in self._dirty:
+            return None
+        
+        entry = self._cache.get(id(layer))
+        if entry is None or entry[0]() is not layer or entry[1] != fingerprint:
+            return None
+        
+        return entry[2]
+    
+    def invalidate(self, identifier=None):
+        '''
+            Marks a layer/tensor (or a list of them) as dirty so
+            it is re-serialized on the next call. If 'identifier'
+            is None, the whole cache is cleared.
+        '''
+        if identifier is None:
+            self._cache.clear()
+            self._dirty.clear()
+        else:
+            for item in (identifier if isinstance(identifier, (list, tuple)) else [identifier]):
+                self._dirty.add(id(_as_layer(item)))
+    
+    def __call__(self, identifier):
+        '''
+            Serializes a list of built layers or tensors into an
+            advanced series, re-emitting only changed layers and
+            their direct consumers.
+            
+            returns dict
+        '''
+        layers = []
+        seen = set()
+        for item in identifier:
+            layer = _as_layer(item)
+            
+            if layer.__class__.__name__ != 'InputLayer' and not id(layer) in seen: #Inputs are assumed when serialized as 'input' and 'input_shape' keys
+                layers.append(layer)
+                seen.add(id(layer))
+        
+        fingerprints = [self._fingerprint(layer) for layer in layers]
+        cached = [self._lookup(layer, fingerprint) for layer, fingerprint in zip(layers, fingerprints)]
+        
+        changed = set(layer.name for layer, serial in zip(layers, cached) if serial is None)
+        
+        series = {}
+        cache = {}
+        for layer, fingerprint, serial in zip(layers, fingerprints, cached):
+            if serial is None or changed.intersection(fingerprint[1]): #changed layer or direct consumer of one
+                serial = serialize(layer)
+            
+            try:
+                reference = weakref.ref(layer)
+            except TypeError:
+                reference = lambda layer=layer: layer
+            
+            cache[id(layer)] = (reference, fingerprint, serial)
+            series[layer.name] = dict(serial, config=dict(serial['config']))
+        
+        self._cache = cache
+        self._dirty.clear()
+        
+        return series
+
+def iter_serialize(identifier, weights=None, compact=False):
+    '''
+        This function is the generator based variant of
+        serialize_graph. The graph is walked from the tensors
+        or layers in 'identifier' (e.g. the outputs of a model),
+        and (name, advanced serial) pairs are yielded producers
+        first, one layer at a time, so a series can be streamed
+        straight to disk (e.g. with KASD.storage.dump).
+        
+        *weights:   Optional WeightStore, see serialize.
+        *compact:   See serialize.
+        
+        yields (name, advanced serial)
+    '''
+    for item in _walk_graph(identifier):
+        if item.__class__.__name__ != 'InputLayer': #Inputs are assumed when serialized as 'input' and 'input_shape' keys
+            yield item.name, serialize(item, weights=weights, compact=compact)
+
+def _inbound_nodes(layer):
+    return getattr(layer, '_inbound_nodes', None) or getattr(layer, 'inbound_nodes', None) or []
+
+def _inbound_layers(layer):
+    '''
+        Returns the layers feeding any inbound node of a layer.
+    '''
+    inbound_layers = []
+    for node in _inbound_nodes(layer):
+        layers = node.inbound_layers
+        inbound_layers.extend(layers if isinstance(layers, (list, tuple)) else [layers])
+    return inbound_layers
+
+def _walk_graph(outputs):
+    '''
+        Returns every layer that the given tensors/layers depend
+        on (included), producers first. The graph is walked once
+        and iteratively through the inbound nodes of each layer.
+        
+        returns [layers]
+    '''
+    if not isinstance(outputs, (list, tuple)):
+        outputs = [outputs]
+    
+    stack = [_as_layer(output) for output in reversed(outputs)]
+    expanded = set()
+    done = set()
+    order = []
+    
+    while stack:
+        layer = stack[-1]
+        
+        if id(layer) in done:
+            stack.pop()
+        elif not id(layer) in expanded:
+            expanded.add(id(layer))
+            stack.extend(inbound for inbound in reversed(_inbound_layers(layer)) if not id(inbound) in done)
+        else:
+            stack.pop()
+            done.add(id(layer))
+            order.append(layer)
+    
+    return order
+
+def serialize_graph(outputs, weights=None, compact=False):
+    '''
+        This function is used to serialize every layer that
+        the tensors or layers in 'outputs' depend on into an
+        advanced series, without listing the layers by hand.
+        The graph is discovered from 'outputs' by walking the
+        inbound nodes of each layer (see _keras_history) once,
+        iteratively, so very deep graphs are supported. Each
+        layer is serialized once, producers first.
+        
+        *weights:   Optional WeightStore, see serialize.
+        *compact:   See serialize.
+        
+        returns dict (advanced series)
+    '''
+    return serialize(_walk_graph(outputs), weights=weights, compact=compact)
+
+def serialize_model(model, weights=None, compact=False):
+    '''
+        This function is used to serialize the layers of a
+        keras Model into an advanced series (see
+        serialize_graph).
+        
+        returns dict (advanced series)
+    '''
+    return serialize_graph(model.outputs, weights=weights, compact=compact)
+
 def update(serial):
     '''
         This function is used to update the output_shape
-        of a serial after modifying attributes.
+        of a serial after modifying attributes. The shape is
+        inferred without keras for native layers (see
+        KASD.shapes); keras is only used for custom layers.
+        Use KASD.shapes.propagate to also update the layers
+        downstream of a serial in an advanced series.
         
         returns None
     '''
-    assert is_advanced_serial(serial)
+    assert classify(serial).kind == SERIAL
     
     try:
-        layer = deserialize({'class_name': serial['class_name'], 'config': deepcopy(serial['config'])})
-        serial['output_shape'] = layer.compute_output_shape(serial['input_shape'])
+        serial['output_shape'] = compute_output_shape(serial)
     except: #if serial is invalid, do nothing
         pass
 
+def _init_worker(custom_objects):
+    '''
+        Initializes a deserialize_many worker process: keras and
+        the KASD registries are loaded once, then the parent's
+        custom objects are registered.
+    '''
+    from . import _register_custom_objects
+    _backend('layers')
+    _register_custom_objects(custom_objects)
+
+def _deserialize_model(identifier, catch_input_errors):
+    '''
+        Builds a keras Model from an advanced series in a
+        deserialize_many worker.
+        
+        returns dict
+    '''
+    clear_session() #do not accumulate graphs between tasks
+    
+    series, report = topological_sort(identifier), []
+    if catch_input_errors:
+        series, report = plan_patches(series)
+    
+    tensors = {} #series name: tensor or [tensors] (multiple outputs), Inputs included
+    if any('inbound_nodes' in value for value in series.values()):
+        _build_nodes(series, tensors, None, _copy_config)
+    else:
+        for name, value in series.items():
+            tensors[name] = _build(value, tensors, None, _copy_config)
+    
+    index = DependencyIndex(series)
+    
+    inputs = [tensors[name] for name in index.inputs]
+    outputs = []
+    for name in series:
+        if len(index.consumers[name]) == 0:
+            outputs.extend(tensors[name] if isinstance(tensors[name], (list, tuple)) else [tensors[name]])
+    model = _backend('models').Model(inputs=inputs, outputs=outputs)
+    
+    return {'model': model.to_json(),
+            'report': report,
+            'shapes': dict((layer.name, {'input_shape': layer.input_shape, 'output_shape': layer.output_shape}) for layer in model.layers)}
+
+def deserialize_many(identifiers, workers=None, catch_input_errors=False):
+    '''
+        This function is used to deserialize a list of advanced
+        series in parallel with a ProcessPoolExecutor. Each
+        worker loads keras and the KASD registries once, and the
+        custom objects registered through the Collection.custom
+        decorators in this process are registered in every worker
+        (they must be picklable, i.e. importable by reference).
+        
+        Each series is built into a keras Model whose inputs are
+        the inputs of the series and whose outputs are the layers
+        without consumers. Results are returned in a picklable
+        form, in the order of 'identifiers':
+            'model':    model.to_json().
+            'report':   patch report of plan_patches (empty unless
+                        'catch_input_errors' is enabled).
+            'shapes':   {'name': {'input_shape', 'output_shape'}}
+                        of every layer of the model.
+        
+        returns [dict]
+    '''
+    from . import _registered_custom_objects
+    
+    identifiers = list(identifiers)
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(_registered_custom_objects(),)) as executor:
+        return list(executor.map(_deserialize_model, identifiers, [catch_input_errors]*len(identifiers)))
+
 def get(identifier):
     '''
         Used to identify the 'identifier' through
@@ -289,7 +1377,7 @@ def get(identifier):
         if callable(identifier):
             return identifier
         else:
-            return deserialize(identifier)
+            return deserialize(identifier, classification=classify(identifier))
     except:
         return None
 
@@ -329,15 +1417,18 @@ layers = _Layers(_GLOBAL_LABELS['layers'])
 custom = layers.custom
 label = layers.label
 
-try:
-    from keras.layers.convolutional_recurrent import ConvRNN2D as _ConvRNN2D
-    custom(_ConvRNN2D)
-except:
-    pass
+[layers.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value if name in layers.native_objects]
 
-from keras import layers as _layers
+def _load_backend_objects():
+    try:
+        from keras.layers.convolutional_recurrent import ConvRNN2D as _ConvRNN2D
+        custom(_ConvRNN2D)
+        [layers.label(key, func='ConvRNN2D') for key, value in _GLOBAL_LABELS.items() if 'ConvRNN2D' in value]
+    except:
+        pass
+    
+    layers._prune_labels(dir(_backend('layers'))) #ensures native keras objects
 
-_dir = dir(_layers)
-[layers.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value if name in _dir] #ensures native keras objects
+_on_backend_load(_load_backend_objects)
 
 
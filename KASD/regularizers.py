@@ -58,12 +58,16 @@ Functionality:
     *label              : (@func) USed to label custom/native keras regularizers.
 '''
 
-from keras.regularizers import serialize, deserialize as _deserialize
+from . import _backend, _on_backend_load, _deserialize_object
+
 import six
 
+def serialize(regularizer):
+    return _backend('regularizers').serialize(regularizer)
+
 def deserialize(identifier, custom_objects=None):
     try:
-        return _deserialize(identifier, custom_objects=custom_objects)
+        return _deserialize_object('regularizers', identifier, custom_objects=custom_objects)
     except:
         raise AttributeError("Use the regularizers.custom decorator for custom object support.")
 
@@ -96,8 +100,7 @@ regularizers = _Regularizers(_GLOBAL_LABELS['regularizers'])
 custom = regularizers.custom
 label = regularizers.label
 
-from keras import regularizers as _regularizers
+[regularizers.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value]
 
-_dir = dir(_regularizers)
-[regularizers.label(key, func=name) for key, value in _GLOBAL_LABELS.items() for name in value if name in _dir] #ensures native keras objects
+_on_backend_load(lambda: regularizers._prune_labels(dir(_backend('regularizers')))) #ensures native keras objects
 
@@ -0,0 +1,588 @@
+'''
+Description:
+    Contains a pure python shape inference engine for advanced
+    serials and series. Output shapes of native keras layers are
+    computed directly from 'class_name', 'config' and
+    'input_shape' without importing the keras backend. Keras is
+    only used as a fallback for layers that are not registered
+    (e.g. custom layers or Lambda layers).
+    
+    Shapes follow the keras convention of tuples that include
+    the batch dimension, where undefined dimensions are None.
+
+Customization:
+    Use the register decorator to add a shape function for a
+    custom layer. A shape function receives the layer config
+    and the input shape and returns the output shape.
+    
+    Example on how to register a custom shape function:
+        from KASD.shapes import register
+        
+        @register('layer')
+        def layer_shape(config, input_shape):
+            return input_shape
+
+Functionality:
+    *compute_output_shape   : (func) Used to compute the output shape of an advanced serial.
+    *propagate              : (func) Used to update the shapes of the layers downstream of changed layers.
+    *register               : (@func) Used to register a shape function for a class_name.
+'''
+
+from .graph import DependencyIndex, _same, _input_shapes, _output_ref_shape, _first_ref
+
+from collections import deque
+
+_SHAPE_FUNCTIONS = {}
+
+class _Unsupported(Exception):
+    '''
+        Raised by shape functions for configurations that
+        cannot be inferred statically.
+    '''
+    pass
+
+def register(*class_names):
+    '''
+        Is a decorator used to register a shape function
+        for one or more class_names.
+    '''
+    def wrapper(func):
+        for class_name in class_names:
+            _SHAPE_FUNCTIONS[class_name] = func
+        return func
+    
+    return wrapper
+
+######Helpers######
+
+def _as_shape(shape):
+    return tuple(shape) if not shape is None else None
+
+def _tuple(value, rank):
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    else:
+        return (value,)*rank
+
+def _pairs(value, rank):
+    '''
+        Normalizes cropping/padding configs into a tuple of
+        (before, after) pairs.
+    '''
+    if isinstance(value, int):
+        return ((value, value),)*rank
+    
+    value = tuple(value)
+    if rank == 1 and len(value) == 2 and isinstance(value[0], int):
+        return (value,)
+    
+    return tuple((item, item) if isinstance(item, int) else tuple(item) for item in value)
+
+def _prod(dims):
+    size = 1
+    for dim in dims:
+        if dim is None:
+            return None
+        size *= dim
+    return size
+
+def _split(input_shape, data_format):
+    '''
+        Splits a shape into (batch_size, spatial dims, channels).
+    '''
+    if data_format == 'channels_first':
+        return input_shape[0], input_shape[2:], input_shape[1]
+    else:
+        return input_shape[0], input_shape[1:-1], input_shape[-1]
+
+def _join(batch_size, spatial, channels, data_format):
+    if data_format == 'channels_first':
+        return (batch_size, channels)+tuple(spatial)
+    else:
+        return (batch_size,)+tuple(spatial)+(channels,)
+
+def conv_output_length(input_length, filter_size, padding, stride, dilation=1):
+    if input_length is None:
+        return None
+    
+    dilated_filter_size = (filter_size-1)*dilation+1
+    
+    if padding in ('same', 'causal'):
+        output_length = input_length
+    elif padding == 'valid':
+        output_length = input_length-dilated_filter_size+1
+    elif padding == 'full':
+        output_length = input_length+dilated_filter_size-1
+    else:
+        raise _Unsupported(padding)
+    
+    return (output_length+stride-1)//stride
+
+def deconv_output_length(input_length, filter_size, padding, stride, output_padding=None, dilation=1):
+    if input_length is None:
+        return None
+    
+    filter_size = filter_size+(filter_size-1)*(dilation-1)
+    
+    if output_padding is None:
+        if padding == 'valid':
+            return input_length*stride+max(filter_size-stride, 0)
+        elif padding == 'full':
+            return input_length*stride-(stride+filter_size-2)
+        elif padding == 'same':
+            return input_length*stride
+        else:
+            raise _Unsupported(padding)
+    else:
+        pad = {'same': filter_size//2, 'valid': 0, 'full': filter_size-1}[padding]
+        return (input_length-1)*stride+filter_size-2*pad+output_padding
+
+######Shape Functions######
+
+@register('InputLayer')
+def _input_layer(config, input_shape):
+    return _as_shape(config.get('batch_input_shape', input_shape))
+
+@register('Activation', 'Dropout', 'ActivityRegularization', 'Masking', 'SpatialDropout1D', 'SpatialDropout2D',
+          'SpatialDropout3D', 'GaussianNoise', 'GaussianDropout', 'AlphaDropout', 'LeakyReLU', 'PReLU', 'ELU',
+          'ThresholdedReLU', 'Softmax', 'ReLU', 'BatchNormalization')
+def _identity(config, input_shape):
+    return input_shape
+
+@register('Dense')
+def _dense(config, input_shape):
+    return input_shape[:-1]+(config['units'],)
+
+@register('Flatten')
+def _flatten(config, input_shape):
+    return (input_shape[0], _prod(input_shape[1:]))
+
+@register('Reshape')
+def _reshape(config, input_shape):
+    target_shape = list(config['target_shape'])
+    
+    if -1 in target_shape:
+        size = _prod(input_shape[1:])
+        known = _prod([dim for dim in target_shape if dim != -1])
+        target_shape[target_shape.index(-1)] = None if size is None or known is None else size//known
+    
+    return (input_shape[0],)+tuple(target_shape)
+
+@register('Permute')
+def _permute(config, input_shape):
+    return (input_shape[0],)+tuple(input_shape[dim] for dim in config['dims'])
+
+@register('RepeatVector')
+def _repeat_vector(config, input_shape):
+    return (input_shape[0], config['n'], input_shape[1])
+
+@register('Add', 'Subtract', 'Multiply', 'Average', 'Maximum', 'Minimum')
+def _elementwise_merge(config, input_shape):
+    shapes = [tuple(shape) for shape in input_shape]
+    
+    output_shape = shapes[0][1:]
+    for shape in shapes[1:]:
+        shape = shape[1:]
+        
+        if len(shape) > len(output_shape):
+            output_shape, shape = shape, output_shape
+        
+        offset = len(output_shape)-len(shape)
+        dims = list(output_shape[:offset])
+        for i, j in zip(output_shape[offset:], shape):
+            if i is None or j is None:
+                dims.append(None)
+            elif i == 1:
+                dims.append(j)
+            elif j == 1 or i == j:
+                dims.append(i)
+            else:
+                raise ValueError('Operands could not be broadcast together with shapes {}'.format(shapes))
+        output_shape = tuple(dims)
+    
+    batch_sizes = set(shape[0] for shape in shapes)-set([None])
+    return (batch_sizes.pop() if len(batch_sizes) == 1 else None,)+output_shape
+
+@register('Concatenate')
+def _concatenate(config, input_shape):
+    shapes = [tuple(shape) for shape in input_shape]
+    axis = config.get('axis', -1)
+    
+    output_shape = list(shapes[0])
+    for shape in shapes[1:]:
+        if output_shape[axis] is None or shape[axis] is None:
+            output_shape[axis] = None
+        else:
+            output_shape[axis] += shape[axis]
+    
+    return tuple(output_shape)
+
+@register('Dot')
+def _dot(config, input_shape):
+    shape1, shape2 = list(input_shape[0]), list(input_shape[1])
+    axes = config['axes']
+    
+    if isinstance(axes, int):
+        axes = [axes % len(shape1), axes % len(shape2)] if axes < 0 else [axes]*2
+    
+    shape1.pop(axes[0])
+    shape2.pop(axes[1])
+    shape2.pop(0)
+    
+    output_shape = shape1+shape2
+    if len(output_shape) == 1:
+        output_shape += [1]
+    
+    return tuple(output_shape)
+
+def _conv(config, input_shape, rank, channels=None):
+    data_format = config.get('data_format', 'channels_last')
+    batch_size, spatial, input_channels = _split(input_shape, data_format)
+    
+    kernel_size = _tuple(config['kernel_size'], rank)
+    strides = _tuple(config.get('strides', 1), rank)
+    dilation_rate = _tuple(config.get('dilation_rate', 1), rank)
+    padding = config.get('padding', 'valid')
+    
+    spatial = [conv_output_length(spatial[i], kernel_size[i], padding, strides[i], dilation_rate[i]) for i in range(rank)]
+    
+    return _join(batch_size, spatial, config['filters'] if channels is None else channels, data_format)
+
+@register('Conv1D', 'SeparableConv1D')
+def _conv1d(config, input_shape):
+    return _conv(config, input_shape, 1)
+
+@register('Conv2D', 'SeparableConv2D')
+def _conv2d(config, input_shape):
+    return _conv(config, input_shape, 2)
+
+@register('Conv3D')
+def _conv3d(config, input_shape):
+    return _conv(config, input_shape, 3)
+
+@register('DepthwiseConv2D')
+def _depthwise_conv2d(config, input_shape):
+    channels = _split(input_shape, config.get('data_format', 'channels_last'))[2]
+    return _conv(config, input_shape, 2, None if channels is None else channels*config.get('depth_multiplier', 1))
+
+def _conv_transpose(config, input_shape, rank):
+    data_format = config.get('data_format', 'channels_last')
+    batch_size, spatial, _ = _split(input_shape, data_format)
+    
+    kernel_size = _tuple(config['kernel_size'], rank)
+    strides = _tuple(config.get('strides', 1), rank)
+    dilation_rate = _tuple(config.get('dilation_rate', 1), rank)
+    output_padding = config.get('output_padding')
+    output_padding = (None,)*rank if output_padding is None else _tuple(output_padding, rank)
+    padding = config.get('padding', 'valid')
+    
+    spatial = [deconv_output_length(spatial[i], kernel_size[i], padding, strides[i], output_padding[i], dilation_rate[i]) for i in range(rank)]
+    
+    return _join(batch_size, spatial, config['filters'], data_format)
+
+@register('Conv2DTranspose')
+def _conv2d_transpose(config, input_shape):
+    return _conv_transpose(config, input_shape, 2)
+
+@register('Conv3DTranspose')
+def _conv3d_transpose(config, input_shape):
+    return _conv_transpose(config, input_shape, 3)
+
+def _resize(config, input_shape, rank, key, func):
+    data_format = config.get('data_format', 'channels_last')
+    batch_size, spatial, channels = _split(input_shape, data_format)
+    
+    values = config[key]
+    values = _pairs(values, rank) if key != 'size' else _tuple(values, rank)
+    
+    spatial = [None if spatial[i] is None else func(spatial[i], values[i]) for i in range(rank)]
+    
+    return _join(batch_size, spatial, channels, data_format)
+
+@register('Cropping1D', 'Cropping2D', 'Cropping3D')
+def _cropping(config, input_shape):
+    return _resize(config, input_shape, len(input_shape)-2, 'cropping', lambda dim, pair: dim-pair[0]-pair[1])
+
+@register('ZeroPadding1D', 'ZeroPadding2D', 'ZeroPadding3D')
+def _zero_padding(config, input_shape):
+    return _resize(config, input_shape, len(input_shape)-2, 'padding', lambda dim, pair: dim+pair[0]+pair[1])
+
+@register('UpSampling1D', 'UpSampling2D', 'UpSampling3D')
+def _up_sampling(config, input_shape):
+    if not 'size' in config and 'length' in config: #keras < 2.1 UpSampling1D
+        config = dict(config, size=config['length'])
+    return _resize(config, input_shape, len(input_shape)-2, 'size', lambda dim, size: dim*size)
+
+@register('MaxPooling1D', 'MaxPooling2D', 'MaxPooling3D', 'AveragePooling1D', 'AveragePooling2D', 'AveragePooling3D')
+def _pooling(config, input_shape):
+    rank = len(input_shape)-2
+    data_format = config.get('data_format', 'channels_last')
+    batch_size, spatial, channels = _split(input_shape, data_format)
+    
+    pool_size = _tuple(config.get('pool_size', 2), rank)
+    strides = config.get('strides')
+    strides = pool_size if strides is None else _tuple(strides, rank)
+    padding = config.get('padding', 'valid')
+    
+    spatial = [conv_output_length(spatial[i], pool_size[i], padding, strides[i]) for i in range(rank)]
+    
+    return _join(batch_size, spatial, channels, data_format)
+
+@register('GlobalMaxPooling1D', 'GlobalMaxPooling2D', 'GlobalMaxPooling3D',
+          'GlobalAveragePooling1D', 'GlobalAveragePooling2D', 'GlobalAveragePooling3D')
+def _global_pooling(config, input_shape):
+    batch_size, _, channels = _split(input_shape, config.get('data_format', 'channels_last'))
+    return (batch_size, channels)
+
+@register('LocallyConnected1D')
+def _locally_connected1d(config, input_shape):
+    return _conv(dict(config, padding='valid'), input_shape, 1)
+
+@register('LocallyConnected2D')
+def _locally_connected2d(config, input_shape):
+    return _conv(dict(config, padding='valid'), input_shape, 2)
+
+@register('Embedding')
+def _embedding(config, input_shape):
+    return tuple(input_shape)+(config['output_dim'],)
+
+_STATE_COUNTS = {'SimpleRNNCell': 1, 'GRUCell': 1, 'LSTMCell': 2, 'ConvLSTM2DCell': 2,
+                 'SimpleRNN': 1, 'GRU': 1, 'LSTM': 2, 'CuDNNGRU': 1, 'CuDNNLSTM': 2, 'ConvLSTM2D': 2}
+
+def _cell_units(cell):
+    '''
+        Returns (output units, [state units]) of a cell serial.
+    '''
+    if cell['class_name'] == 'StackedRNNCells':
+        states = []
+        for sub_cell in cell['config']['cells']:
+            units, sub_states = _cell_units(sub_cell)
+            states += sub_states
+        return units, states
+    elif cell['class_name'] in _STATE_COUNTS and 'units' in cell['config']:
+        return cell['config']['units'], [cell['config']['units']]*_STATE_COUNTS[cell['class_name']]
+    else:
+        raise _Unsupported(cell['class_name'])
+
+def _recurrent_output(config, batch_size, timesteps, output, states):
+    '''
+        Shapes the output of a recurrent layer given the shape
+        of a single step output and of its states.
+    '''
+    output_shape = (batch_size, timesteps)+output if config.get('return_sequences', False) else (batch_size,)+output
+    
+    if config.get('return_state', False):
+        return [output_shape]+[(batch_size,)+state for state in states]
+    else:
+        return output_shape
+
+@register('RNN')
+def _rnn(config, input_shape):
+    units, states = _cell_units(config['cell'])
+    return _recurrent_output(config, input_shape[0], input_shape[1], (units,), [(state,) for state in states])
+
+def _recurrent(class_name):
+    def shape_function(config, input_shape):
+        units = config['units']
+        return _recurrent_output(config, input_shape[0], input_shape[1], (units,), [(units,)]*_STATE_COUNTS[class_name])
+    
+    return shape_function
+
+for _class_name in ('SimpleRNN', 'GRU', 'LSTM', 'CuDNNGRU', 'CuDNNLSTM'):
+    register(_class_name)(_recurrent(_class_name))
+
+def _conv_recurrent(config, cell_config, input_shape):
+    data_format = cell_config.get('data_format', 'channels_last')
+    batch_size, timesteps = input_shape[0], input_shape[1]
+    _, spatial, _ = _split((batch_size,)+tuple(input_shape[2:]), data_format)
+    
+    kernel_size = _tuple(cell_config['kernel_size'], 2)
+    strides = _tuple(cell_config.get('strides', 1), 2)
+    dilation_rate = _tuple(cell_config.get('dilation_rate', 1), 2)
+    padding = cell_config.get('padding', 'valid')
+    
+    spatial = [conv_output_length(spatial[i], kernel_size[i], padding, strides[i], dilation_rate[i]) for i in range(2)]
+    step = _join(batch_size, spatial, cell_config['filters'], data_format)[1:]
+    
+    return _recurrent_output(config, batch_size, timesteps, step, [step, step])
+
+@register('ConvLSTM2D')
+def _conv_lstm2d(config, input_shape):
+    return _conv_recurrent(config, config, input_shape)
+
+@register('ConvRNN2D')
+def _conv_rnn2d(config, input_shape):
+    cell = config['cell']
+    if cell['class_name'] != 'ConvLSTM2DCell':
+        raise _Unsupported(cell['class_name'])
+    return _conv_recurrent(config, cell['config'], input_shape)
+
+@register('Bidirectional')
+def _bidirectional(config, input_shape):
+    layer = config['layer']
+    if layer['config'].get('return_state', False):
+        raise _Unsupported('return_state')
+    
+    output_shape = _infer(layer['class_name'], layer['config'], input_shape)
+    merge_mode = config.get('merge_mode', 'concat')
+    
+    if merge_mode == 'concat':
+        return output_shape[:-1]+(None if output_shape[-1] is None else output_shape[-1]*2,)
+    elif merge_mode is None:
+        return [output_shape, output_shape]
+    else:
+        return output_shape
+
+@register('TimeDistributed')
+def _time_distributed(config, input_shape):
+    layer = config['layer']
+    child_output_shape = _infer(layer['class_name'], layer['config'], (input_shape[0],)+tuple(input_shape[2:]))
+    return (child_output_shape[0], input_shape[1])+tuple(child_output_shape[1:])
+
+######Engine######
+
+def _normalize(input_shape):
+    '''
+        Converts (json) lists into the tuple based shapes used
+        by keras, for single and multiple inputs.
+    '''
+    if isinstance(input_shape, (list, tuple)) and len(input_shape) > 0 and isinstance(input_shape[0], (list, tuple)):
+        return [tuple(shape) for shape in input_shape]
+    else:
+        return _as_shape(input_shape)
+
+def _infer(class_name, config, input_shape):
+    if not class_name in _SHAPE_FUNCTIONS:
+        raise _Unsupported(class_name)
+    return _SHAPE_FUNCTIONS[class_name](config, _normalize(input_shape))
+
+def _keras_output_shape(serial, custom_objects=None):
+    from .layers import deserialize, Classification, NATIVE
+    from copy import deepcopy
+    
+    layer = deserialize({'class_name': serial['class_name'], 'config': deepcopy(serial['config'])},
+                        custom_objects=custom_objects, classification=Classification(NATIVE, None))
+    return layer.compute_output_shape(_normalize(serial['input_shape']))
+
+def compute_output_shape(serial, custom_objects=None, fallback=True):
+    '''
+        This function is used to compute the output shape of
+        an advanced serial from its 'class_name', 'config' and
+        'input_shape'. Registered shape functions are used
+        first; keras is only used (when 'fallback' is enabled)
+        for layers that are not registered or cannot be
+        inferred statically.
+        
+        returns shape/[shapes]
+    '''
+    try:
+        return _infer(serial['class_name'], serial['config'], serial['input_shape'])
+    except (_Unsupported, KeyError, TypeError, IndexError):
+        if not fallback:
+            raise
+        return _keras_output_shape(serial, custom_objects=custom_objects)
+
+def _node_output_shape(serial, node, custom_objects=None, fallback=True):
+    '''
+        Returns the output shape of a later call of a shared
+        layer from the input shapes of its node (see
+        'inbound_nodes').
+    '''
+    input_shapes = [ref[3] for ref in node]
+    return compute_output_shape({'class_name': serial['class_name'], 'config': serial['config'], 'input': [ref[0] for ref in node],
+                                 'input_shape': input_shapes[0] if len(node) == 1 else input_shapes, 'output_shape': None},
+                                custom_objects=custom_objects, fallback=fallback)
+
+def _update_nodes(series, index, events, custom_objects=None, fallback=True):
+    '''
+        Updates the shapes in the 'inbound_nodes' that refer to
+        the outputs in 'events', a list of (name, node_index,
+        output shape). Later calls whose input shapes change are
+        recomputed and their consumers updated in turn.
+    '''
+    events = deque(events)
+    
+    while events:
+        name, node_index, output_shape = events.popleft()
+        
+        for consumer in set(index.consumers.get(name, ())).union(index.node_consumers.get(name, ())):
+            serial = series[consumer]
+            if not 'inbound_nodes' in serial:
+                continue
+            
+            nodes = serial['inbound_nodes'] = list(serial['inbound_nodes'])
+            
+            for k, node in enumerate(nodes):
+                new = [[ref[0], ref[1], ref[2], _output_ref_shape(output_shape, ref[2])] if ref[0] == name and ref[1] == node_index else ref for ref in node]
+                
+                if all(_same(ref[3], new_ref[3]) for ref, new_ref in zip(node, new)):
+                    continue
+                
+                nodes[k] = new
+                
+                if k > 0: #the first call is updated through 'input_shape'
+                    events.append((consumer, k, _node_output_shape(serial, new, custom_objects, fallback)))
+
+def propagate(series, changed=None, custom_objects=None, fallback=True, index=None):
+    '''
+        This function is used to update the 'output_shape' of
+        the layers named in 'changed' and the 'input_shape' and
+        'output_shape' of every layer downstream of them in an
+        advanced series. Only the affected subgraph is visited,
+        in topological order, and propagation stops at layers
+        whose output shape did not change. If 'changed' is None, every layer is updated.
+        
+        The shapes in 'inbound_nodes' (see KASD.layers.serialize)
+        are updated as well, including the later calls of shared
+        layers that refer to updated outputs.
+        
+        *index:     Optional KASD.graph.DependencyIndex of the
+                    series, to avoid indexing it on every call.
+        
+        The series is updated in place.
+        
+        returns [names of updated layers]
+    '''
+    if index is None:
+        index = DependencyIndex(series)
+    
+    if changed is None:
+        changed = list(series.keys())
+    changed = set(changed)
+    
+    updated = []
+    dirty = set()
+    
+    for name in index.downstream_order(name for name in changed if name in series):
+        if not name in changed and not any(producer in dirty for producer in index.producers[name]):
+            continue
+        
+        serial = series[name]
+        
+        output_shape = compute_output_shape(serial, custom_objects=custom_objects, fallback=fallback)
+        if _normalize(serial['output_shape']) == output_shape and not name in changed:
+            continue
+        
+        serial['output_shape'] = output_shape
+        updated.append(name)
+        dirty.add(name)
+        
+        for consumer in index.consumers.get(name, ()):
+            consumer_serial = series[consumer]
+            input_shape = list(_input_shapes(consumer_serial))
+            
+            for i, input_name in enumerate(consumer_serial['input']):
+                node_index, tensor_index = _first_ref(consumer_serial, i)
+                
+                if input_name == name and node_index == 0:
+                    input_shape[i] = _output_ref_shape(output_shape, tensor_index)
+            
+            consumer_serial['input_shape'] = input_shape[0] if len(input_shape) == 1 else input_shape
+        
+        events = [(name, 0, output_shape)]
+        if name in changed: #later calls of a changed shared layer
+            events += [(name, k, _node_output_shape(serial, node, custom_objects, fallback)) for k, node in enumerate(serial.get('inbound_nodes', [])[1:], 1)]
+        
+        _update_nodes(series, index, events, custom_objects, fallback)
+    
+    return updated
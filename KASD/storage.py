@@ -0,0 +1,428 @@
+'''
+Description:
+    Contains a compact binary container for advanced series
+    (see KASD.layers.serialize) with lazy, per layer decoding.
+    
+    Layout (little-endian):
+        header:         b'KASD', uint16 version.
+        records:        one encoded advanced serial per layer.
+        string table:   every str (class_names, config keys,
+                        names, ...) stored once and referred to
+                        by index in the records.
+        offset table:   (name, offset, length) of each record.
+        footer:         offsets of the string and offset tables
+                        and b'KASD'.
+    
+    Tuples and lists of ints/None (shapes, kernel sizes, ...)
+    are packed as int64 arrays. Because the tables are written
+    after the records, a series can be dumped from any iterable
+    of (name, advanced serial) pairs without holding it in memory.
+    
+    Layer weights are kept out of the records: advanced serials
+    only hold references ({'offset', 'shape', 'dtype'}) into the
+    contiguous buffer of a WeightStore, which can be saved as a
+    .npy sidecar file and memory-mapped when loaded.
+
+Functionality:
+    *dump               : (func) Used to write an advanced series to a binary file.
+    *load               : (func) Used to open a binary file as a lazy advanced series.
+    *LazySeries         : (class) Read-only mapping that decodes each advanced serial on access.
+    *WeightStore        : (class) Used to store layer weights in one contiguous buffer.
+'''
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import numpy as np
+import struct
+import mmap
+import six
+
+_MAGIC = b'KASD'
+_VERSION = 1
+
+_HEADER = struct.Struct('<4sH')
+_FOOTER = struct.Struct('<QQ4s')
+_UINT32 = struct.Struct('<I')
+_INT64 = struct.Struct('<q')
+_FLOAT64 = struct.Struct('<d')
+_ENTRY = struct.Struct('<IQQ')
+
+_NONE_DIM = -2**63 #stands for None in packed arrays
+
+_INT64_MIN = -2**63+1
+_INT64_MAX = 2**63-1
+
+_TAGS = dict((ord(tag), tag.encode('ascii')) for tag in 'NTFiIfsSPtldDb') #indexing a buffer returns ints
+
+class _Encoder():
+    '''
+        Encodes values into bytes while interning strings.
+    '''
+    
+    def __init__(self):
+        self.strings = []
+        self._ids = {}
+    
+    def intern(self, string):
+        try:
+            return self._ids[string]
+        except KeyError:
+            i = self._ids[string] = len(self.strings)
+            self.strings.append(string)
+            return i
+    
+    def _packable(self, value):
+        return len(value) > 0 and all(item is None or (isinstance(item, six.integer_types) and not isinstance(item, bool)
+                                                       and _INT64_MIN <= item <= _INT64_MAX) for item in value)
+    
+    def encode(self, value, out):
+        if value is None:
+            out.append(b'N')
+        elif value is True:
+            out.append(b'T')
+        elif value is False:
+            out.append(b'F')
+        elif isinstance(value, six.integer_types):
+            if _INT64_MIN <= value <= _INT64_MAX:
+                out.append(b'i'+_INT64.pack(value))
+            else:
+                out.append(b'I'+_UINT32.pack(self.intern(str(value))))
+        elif isinstance(value, float):
+            out.append(b'f'+_FLOAT64.pack(value))
+        elif isinstance(value, six.string_types):
+            out.append(b's'+_UINT32.pack(self.intern(value)))
+        elif isinstance(value, (tuple, list)):
+            if self._packable(value):
+                out.append((b'S' if isinstance(value, tuple) else b'P')+_UINT32.pack(len(value)))
+                out.append(struct.pack('<{}q'.format(len(value)), *[_NONE_DIM if item is None else item for item in value]))
+            else:
+                out.append((b't' if isinstance(value, tuple) else b'l')+_UINT32.pack(len(value)))
+                for item in value:
+                    self.encode(item, out)
+        elif isinstance(value, dict):
+            if all(isinstance(key, six.string_types) for key in value):
+                out.append(b'd'+_UINT32.pack(len(value)))
+                for key, item in value.items():
+                    out.append(_UINT32.pack(self.intern(key)))
+                    self.encode(item, out)
+            else:
+                out.append(b'D'+_UINT32.pack(len(value)))
+                for key, item in value.items():
+                    self.encode(key, out)
+                    self.encode(item, out)
+        elif isinstance(value, (bytes, bytearray)):
+            out.append(b'b'+_UINT32.pack(len(value))+bytes(value))
+        elif hasattr(value, 'tolist'): #numpy scalars/arrays
+            self.encode(value.tolist(), out)
+        else:
+            raise TypeError("Cannot encode object of type '{}'.".format(type(value).__name__))
+
+class _Decoder():
+    '''
+        Decodes values from a buffer given the string table.
+    '''
+    
+    def __init__(self, buffer, strings):
+        self.buffer = buffer
+        self.strings = strings
+    
+    def decode(self, offset):
+        buffer = self.buffer
+        tag = _TAGS.get(buffer[offset])
+        offset += 1
+        
+        if tag == b'N':
+            return None, offset
+        elif tag == b'T':
+            return True, offset
+        elif tag == b'F':
+            return False, offset
+        elif tag == b'i':
+            return _INT64.unpack_from(buffer, offset)[0], offset+8
+        elif tag == b'I':
+            return int(self.strings[_UINT32.unpack_from(buffer, offset)[0]]), offset+4
+        elif tag == b'f':
+            return _FLOAT64.unpack_from(buffer, offset)[0], offset+8
+        elif tag == b's':
+            return self.strings[_UINT32.unpack_from(buffer, offset)[0]], offset+4
+        elif tag in (b'S', b'P'):
+            count = _UINT32.unpack_from(buffer, offset)[0]
+            offset += 4
+            items = [None if item == _NONE_DIM else item for item in struct.unpack_from('<{}q'.format(count), buffer, offset)]
+            return (tuple(items) if tag == b'S' else items), offset+8*count
+        elif tag in (b't', b'l'):
+            count = _UINT32.unpack_from(buffer, offset)[0]
+            offset += 4
+            items = []
+            for _ in range(count):
+                item, offset = self.decode(offset)
+                items.append(item)
+            return (tuple(items) if tag == b't' else items), offset
+        elif tag == b'd':
+            count = _UINT32.unpack_from(buffer, offset)[0]
+            offset += 4
+            value = {}
+            for _ in range(count):
+                key = self.strings[_UINT32.unpack_from(buffer, offset)[0]]
+                value[key], offset = self.decode(offset+4)
+            return value, offset
+        elif tag == b'D':
+            count = _UINT32.unpack_from(buffer, offset)[0]
+            offset += 4
+            value = {}
+            for _ in range(count):
+                key, offset = self.decode(offset)
+                value[key], offset = self.decode(offset)
+            return value, offset
+        elif tag == b'b':
+            count = _UINT32.unpack_from(buffer, offset)[0]
+            offset += 4
+            return bytes(buffer[offset:offset+count]), offset+count
+        else:
+            raise ValueError("Invalid tag {} at offset {}.".format(buffer[offset-1], offset-1))
+
+def dump(series, file):
+    '''
+        This function is used to write an advanced series into
+        the binary container described in KASD.storage. 'series'
+        can be a dict or any iterable of (name, advanced serial)
+        pairs; records are written as they are consumed. 'file'
+        is a path or a binary file object.
+        
+        returns int (number of layers written)
+    '''
+    if isinstance(file, six.string_types):
+        with open(file, 'wb') as f:
+            return dump(series, f)
+    
+    if isinstance(series, dict):
+        series = series.items()
+    
+    encoder = _Encoder()
+    entries = []
+    
+    file.write(_HEADER.pack(_MAGIC, _VERSION))
+    position = _HEADER.size
+    
+    for name, serial in series:
+        out = []
+        encoder.encode(serial, out)
+        record = b''.join(out)
+        
+        entries.append((encoder.intern(name), position, len(record)))
+        file.write(record)
+        position += len(record)
+    
+    strings_offset = position
+    out = [_UINT32.pack(len(encoder.strings))]
+    for string in encoder.strings:
+        string = string.encode('utf-8')
+        out.append(_UINT32.pack(len(string))+string)
+    strings = b''.join(out)
+    file.write(strings)
+    position += len(strings)
+    
+    index_offset = position
+    file.write(_UINT32.pack(len(entries))+b''.join(_ENTRY.pack(*entry) for entry in entries))
+    file.write(_FOOTER.pack(strings_offset, index_offset, _MAGIC))
+    
+    return len(entries)
+
+class LazySeries(Mapping):
+    '''
+    Description:
+        Is a read-only mapping of {'name': advanced serial} over
+        a binary container written by dump. Only the string and
+        offset tables are read when opened; each advanced serial
+        is decoded when it is accessed. Files are memory-mapped
+        when possible.
+        
+        Decoded serials are new objects on every access and can
+        be modified freely.
+    '''
+    
+    def __init__(self, buffer, closer=None):
+        self._buffer = buffer
+        self._closer = closer
+        
+        magic, version = _HEADER.unpack_from(buffer, 0)
+        strings_offset, index_offset, end = _FOOTER.unpack_from(buffer, len(buffer)-_FOOTER.size)
+        
+        if magic != _MAGIC or end != _MAGIC:
+            raise ValueError('Not a KASD advanced series container.')
+        if version > _VERSION:
+            raise ValueError('Unsupported KASD container version {}.'.format(version))
+        
+        count = _UINT32.unpack_from(buffer, strings_offset)[0]
+        offset = strings_offset+4
+        strings = []
+        for _ in range(count):
+            length = _UINT32.unpack_from(buffer, offset)[0]
+            strings.append(bytes(buffer[offset+4:offset+4+length]).decode('utf-8'))
+            offset += 4+length
+        
+        count = _UINT32.unpack_from(buffer, index_offset)[0]
+        self._index = {}
+        for i in range(count):
+            name, offset, length = _ENTRY.unpack_from(buffer, index_offset+4+i*_ENTRY.size)
+            self._index[strings[name]] = offset
+        
+        self._decoder = _Decoder(buffer, strings)
+    
+    def __getitem__(self, name):
+        return self._decoder.decode(self._index[name])[0]
+    
+    def __iter__(self):
+        return iter(self._index)
+    
+    def __len__(self):
+        return len(self._index)
+    
+    def __contains__(self, name):
+        return name in self._index
+    
+    def close(self):
+        if not self._closer is None:
+            self._decoder = self._buffer = None
+            self._closer()
+            self._closer = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+def load(file, use_mmap=True):
+    '''
+        This function is used to open a binary container
+        written by dump as a LazySeries. 'file' is a path, a
+        binary file object or a bytes-like object. Files are
+        memory-mapped when 'use_mmap' is enabled.
+        
+        Use dict(load(file)) to decode every layer at once.
+        
+        returns LazySeries
+    '''
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return LazySeries(memoryview(file))
+    
+    if isinstance(file, six.string_types):
+        f = open(file, 'rb')
+        closers = [f.close]
+    else:
+        f = file
+        closers = []
+    
+    if use_mmap:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            closers.insert(0, buffer.close)
+        except (AttributeError, OSError, ValueError, IOError):
+            buffer = f.read()
+    else:
+        buffer = f.read()
+    
+    def closer():
+        for close in closers:
+            close()
+    
+    return LazySeries(buffer, closer=closer)
+
+class WeightStore():
+    '''
+    Description:
+        Is a class used to store numpy arrays (e.g. the weights
+        of layers) in one contiguous byte buffer. Each array is
+        added once and referred to by a dict of
+        {'offset': int, 'shape': [int], 'dtype': str}, which can
+        be kept in advanced serials (see KASD.layers.serialize).
+        
+        Arrays returned by self.get are read-only views of the
+        buffer, so no copy is made when they are read, e.g. by
+        layer.set_weights. Arrays are aligned to 'alignment'
+        bytes.
+        
+        A store can be saved as a .npy file (a flat uint8 array)
+        with self.save and memory-mapped by WeightStore.load, in
+        which case arrays are read from disk when accessed.
+    '''
+    
+    def __init__(self, buffer=None, alignment=64):
+        if buffer is None:
+            buffer = np.zeros(0, dtype=np.uint8)
+        elif not isinstance(buffer, np.ndarray):
+            buffer = np.frombuffer(buffer, dtype=np.uint8)
+        
+        self._alignment = alignment
+        self._buffer = buffer
+        self._chunks = [] #arrays added since the buffer was last joined
+        self._size = len(self._buffer)
+    
+    def __len__(self):
+        return self._size
+    
+    @property
+    def buffer(self):
+        '''
+            Returns the contiguous buffer as a uint8 array. Arrays
+            added since the last access are joined once.
+        '''
+        if self._chunks:
+            self._buffer = np.frombuffer(b''.join([self._buffer]+self._chunks), dtype=np.uint8)
+            self._chunks = []
+        
+        return self._buffer
+    
+    def put(self, array):
+        '''
+            Adds an array to the store.
+            
+            returns dict (reference)
+        '''
+        array = np.asarray(array, order='C')
+        
+        padding = -self._size % self._alignment
+        if padding:
+            self._chunks.append(b'\0'*padding)
+            self._size += padding
+        
+        reference = {'offset': self._size, 'shape': list(array.shape), 'dtype': array.dtype.str}
+        
+        self._chunks.append(array.reshape(-1).view(np.uint8))
+        self._size += array.nbytes
+        
+        return reference
+    
+    def get(self, reference):
+        '''
+            Returns a read-only view of a referenced array.
+            
+            returns numpy.ndarray
+        '''
+        dtype = np.dtype(reference['dtype'])
+        nbytes = int(np.prod(reference['shape'], dtype=np.int64))*dtype.itemsize
+        
+        array = self.buffer[reference['offset']:reference['offset']+nbytes].view(dtype).reshape(reference['shape'])
+        array.flags.writeable = False
+        return array
+    
+    def save(self, file):
+        '''
+            Saves the buffer as a .npy file (see numpy.save).
+            'file' is a path or a binary file object.
+        '''
+        np.save(file, self.buffer, allow_pickle=False)
+    
+    @classmethod
+    def load(cls, file, use_mmap=True):
+        '''
+            Opens a .npy file written by self.save. The file is
+            memory-mapped when 'use_mmap' is enabled.
+            
+            returns WeightStore
+        '''
+        return cls(np.load(file, mmap_mode='r' if use_mmap else None, allow_pickle=False))
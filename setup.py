@@ -17,4 +17,5 @@ setuptools.setup(
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent"],
-    python_requires='>=2.7')
+    install_requires=['numpy>=1.17'],
+    python_requires='>=3.5')
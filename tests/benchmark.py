@@ -0,0 +1,260 @@
+'''
+Description:
+    Benchmark suite for KASD. Timings (best of --repeat runs, in
+    seconds) are written as a flat json dict of
+    {'section/case/operation': seconds}:
+        layers/<class_name>/<build|serialize|deserialize|update|patch>
+            For every entry of tests/layer_matrix.py. 'patch'
+            deserializes the layer behind producers of the wrong
+            shape with catch_input_errors enabled.
+        chain/<n>/<operation>, dag/<n>/<operation>
+            Synthetic advanced series of n layers: a chain of
+            Dense layers, and a wide DAG of sqrt(n) Dense
+            branches merged by Add layers level by level.
+        choice/<n>/<choice|choice_labels|sample>
+            Collection draws for a registry of n names.
+    
+    Operations that fail are reported and left out of the
+    results.
+
+Usage:
+    python tests/benchmark.py --output results.json
+    python tests/benchmark.py --baseline results.json --threshold 0.2
+    
+    With --baseline, every timing is compared with the saved
+    baseline and the script exits with status 1 if any of them
+    is slower by more than --threshold (relative).
+'''
+
+from KASD import Collection, _backend
+from KASD.layers import get, serialize, deserialize, update, plan_patches, fingerprint, propagate, estimate, clear_session
+
+from layer_matrix import LAYER_MATRIX, build
+
+from collections import OrderedDict
+import traceback
+import argparse
+import platform
+import time
+import json
+import sys
+
+def timeit(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter()-start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def record(results, key, func, repeat):
+    try:
+        results[key] = timeit(func, repeat)
+    except:
+        print('{}: Failed'.format(key))
+        traceback.print_exc()
+
+######Layer Matrix######
+
+def wrong_shape_series(serial, batch_shapes):
+    '''
+        Returns an advanced series where every input of 'serial'
+        is produced by a Dense layer of the wrong size, so that
+        catch_input_errors has to patch each of them.
+    '''
+    series = OrderedDict()
+    input_names = []
+    
+    for i, batch_shape in enumerate(batch_shapes):
+        name = 'benchmark_producer_{}'.format(i)
+        series[name] = {'class_name': 'Dense', 'config': {'name': name, 'units': 7},
+                        'input': ['benchmark_input_{}'.format(i)], 'input_shape': (batch_shape[0], 3),
+                        'output_shape': (batch_shape[0], 7)}
+        input_names.append(name)
+    
+    series[serial['config']['name']] = dict(serial, input=input_names)
+    return series
+
+def benchmark_layers(results, repeat):
+    Input = _backend('layers').Input
+    
+    for family, entries in LAYER_MATRIX.items():
+        for input_batch_shape, class_name, arg, kwargs in entries:
+            clear_session()
+            
+            batch_shapes = input_batch_shape if isinstance(input_batch_shape, list) else [input_batch_shape]
+            key = 'layers/{}'.format(class_name)
+            if 'layer_cell' in kwargs:
+                key += '({})'.format(kwargs['layer_cell'][0])
+            
+            def build_layer():
+                inputs = [Input(batch_shape=batch_shape) for batch_shape in batch_shapes]
+                return inputs, build(get, (class_name, arg, kwargs))(inputs if len(inputs) > 1 else inputs[0])
+            
+            record(results, key+'/build', build_layer, repeat)
+            
+            try:
+                inputs, tensor = build_layer()
+                serial = serialize(tensor)
+            except:
+                continue
+            
+            record(results, key+'/serialize', lambda: serialize(tensor), repeat)
+            record(results, key+'/deserialize', lambda: deserialize(serial), repeat)
+            record(results, key+'/update', lambda: update(dict(serial)), repeat)
+            
+            series = wrong_shape_series(serial, batch_shapes)
+            record(results, key+'/patch', lambda: deserialize(series, catch_input_errors=True), repeat)
+
+######Synthetic Series######
+
+def dense(name, input_name, units, input_units):
+    return {'class_name': 'Dense', 'config': {'name': name, 'units': units},
+            'input': [input_name], 'input_shape': (None, input_units), 'output_shape': (None, units)}
+
+def chain(n, units=8):
+    series = OrderedDict()
+    input_name = 'input'
+    for i in range(n):
+        name = 'dense_{}'.format(i)
+        series[name] = dense(name, input_name, units, units)
+        input_name = name
+    return series
+
+def dag(n, units=8):
+    width = max(2, int(n**0.5))
+    series = OrderedDict()
+    level = []
+    
+    for i in range(min(width, n)):
+        name = 'dense_{}'.format(i)
+        series[name] = dense(name, 'input', units, units)
+        level.append(name)
+    
+    while len(series) < n:
+        next_level = []
+        for i in range(min(width, n-len(series))):
+            name = 'add_{}'.format(len(series))
+            input_names = [level[i%len(level)], level[(i+1)%len(level)]]
+            series[name] = {'class_name': 'Add', 'config': {'name': name}, 'input': input_names,
+                            'input_shape': [(None, units), (None, units)], 'output_shape': (None, units)}
+            next_level.append(name)
+        level = next_level
+    
+    return series
+
+def benchmark_series(results, sizes, repeat):
+    for kind, generate in (('chain', chain), ('dag', dag)):
+        for n in sizes:
+            clear_session()
+            
+            key = '{}/{}'.format(kind, n)
+            series = generate(n)
+            first = next(iter(series))
+            
+            record(results, key+'/fingerprint', lambda: fingerprint(series), repeat)
+            record(results, key+'/plan_patches', lambda: plan_patches(series), repeat)
+            record(results, key+'/propagate', lambda: propagate(series, changed=[first]), repeat)
+            record(results, key+'/estimate', lambda: estimate(series), repeat)
+            record(results, key+'/deserialize', lambda: deserialize(series), repeat)
+            
+            try:
+                tensors = deserialize(series)
+            except:
+                continue
+            
+            record(results, key+'/serialize', lambda: serialize(tensors), repeat)
+
+######Collection######
+
+def benchmark_choice(results, sizes, repeat, draws=1000):
+    for n in sizes:
+        collection = Collection(['name_{}'.format(i) for i in range(n)], seed=0)
+        for i in range(0, n, 2):
+            collection.label('even', func='name_{}'.format(i))
+        
+        key = 'choice/{}'.format(n)
+        
+        def choice():
+            for _ in range(draws):
+                collection.choice()
+        
+        def choice_labels():
+            for _ in range(draws):
+                collection.choice(labels=['even'])
+        
+        record(results, key+'/choice', choice, repeat)
+        record(results, key+'/choice_labels', choice_labels, repeat)
+        record(results, key+'/sample', lambda: collection.sample(draws), repeat)
+
+######Comparison######
+
+def compare(results, baseline, threshold):
+    '''
+        Prints the ratio of every timing to the baseline and
+        returns the keys that regressed by more than
+        'threshold'.
+    '''
+    regressions = []
+    
+    for key in sorted(set(results).intersection(baseline)):
+        ratio = results[key]/baseline[key] if baseline[key] > 0 else float('inf')
+        regressed = ratio > 1+threshold
+        
+        if regressed:
+            regressions.append(key)
+        
+        print('{:<60}{:>12.6f}{:>12.6f}{:>8.2f}x{}'.format(key, baseline[key], results[key], ratio, ' REGRESSION' if regressed else ''))
+    
+    missing = set(baseline).difference(results)
+    if missing:
+        print('{} baseline timing(s) were not measured.'.format(len(missing)))
+    
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='KASD benchmark suite.')
+    parser.add_argument('--output', help='path of the json results')
+    parser.add_argument('--baseline', help='path of saved json results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown reported as a regression')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sizes', default='10,100,1000,10000', help='comma separated sizes of the synthetic series')
+    parser.add_argument('--registry-sizes', default='10,100,1000,10000', help='comma separated sizes of the collections')
+    parser.add_argument('--sections', default='layers,series,choice')
+    args = parser.parse_args(argv)
+    
+    sections = args.sections.split(',')
+    results = OrderedDict()
+    
+    if 'layers' in sections:
+        benchmark_layers(results, args.repeat)
+    if 'series' in sections:
+        benchmark_series(results, [int(n) for n in args.sizes.split(',')], args.repeat)
+    if 'choice' in sections:
+        benchmark_choice(results, [int(n) for n in args.registry_sizes.split(',')], args.repeat)
+    
+    report = {'meta': {'python': platform.python_version(), 'keras': getattr(sys.modules.get('keras'), '__version__', None),
+                       'repeat': args.repeat, 'time': time.time()},
+              'results': results}
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    elif not args.baseline:
+        print(json.dumps(report, indent=1))
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        
+        regressions = compare(results, baseline, args.threshold)
+        
+        if regressions:
+            print('{} regression(s) over {:.0%}.'.format(len(regressions), args.threshold))
+            return 1
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+#each statement is timed in a fresh interpreter, the backend statement
+#loads keras and every registry as 'import KASD' did before lazy loading
+STATEMENTS = {
+    'import': "import KASD.layers, KASD.activations, KASD.constraints, KASD.initializers, KASD.regularizers",
+    'import + sample': "import KASD.layers; KASD.layers.layers.sample(100, labels=['convolutional'])",
+    'import + backend': "import KASD.layers; KASD._backend('layers')"}
+
+def measureImportTime(repeat=5):
+    results = {}
+    
+    for name, statement in STATEMENTS.items():
+        code = "import time; start = time.perf_counter(); {}; print(time.perf_counter()-start)".format(statement)
+        times = sorted(float(subprocess.check_output([sys.executable, '-c', code]).decode().strip().splitlines()[-1]) for _ in range(repeat))
+        results[name] = times[len(times)//2]
+        
+        print('{:<20}{:>10.4f}s (median of {})'.format(name, results[name], repeat))
+    
+    print('{:<20}{:>10.1f}x'.format('speedup', results['import + backend']/results['import']))
+    
+    return results
+
+measureImportTime()
@@ -0,0 +1,160 @@
+'''
+Description:
+    Contains the layer matrix shared by tests/test.py and
+    tests/benchmark.py: one entry per native layer family member
+    as (input_batch_shape, class_name, arg, kwargs).
+    
+    input_batch_shape is a tuple, or a list of tuples for layers
+    with multiple inputs. kwargs may contain 'layer_cell', a
+    (class_name, arg, kwargs) entry of the layer (or list of
+    layers) passed as the first argument, e.g. the cell of an RNN
+    or the layer of a Wrapper.
+'''
+
+from collections import OrderedDict
+
+a = (None, 10)
+b = (None, 10, 10)
+bb = (10, 10, 10)
+c = (None, 10, 10, 10)
+cc = (10, 10, 10, 10)
+d = (None, 10, 10, 10, 10)
+dd = (10, 10, 10, 10, 10)
+
+LAYER_MATRIX = OrderedDict([
+    ('advanced_activations', [
+        (a, 'LeakyReLU', (), {}),
+        (a, 'PReLU', (), {}),
+        (a, 'ThresholdedReLU', (), {}),
+        (a, 'Softmax', (), {}),
+        (a, 'ReLU', (), {})]),
+    
+    ('convolutional', [
+        (b, 'Conv1D', (10, 1), {}),
+        (c, 'Conv2D', (10, 1), {}),
+        (d, 'Conv3D', (10, 1), {}),
+        (c, 'Conv2DTranspose', (10, 1), {}),
+        (d, 'Conv3DTranspose', (10, 1), {}),
+        (b, 'SeparableConv1D', (10, 1), {}),
+        (c, 'SeparableConv2D', (10, 1), {}),
+        (c, 'DepthwiseConv2D', (1,), {}),
+        (b, 'UpSampling1D', (), {}),
+        (c, 'UpSampling2D', (), {}),
+        (d, 'UpSampling3D', (), {}),
+        (b, 'ZeroPadding1D', (), {}),
+        (c, 'ZeroPadding2D', (), {}),
+        (d, 'ZeroPadding3D', (), {}),
+        (b, 'Cropping1D', (), {}),
+        (c, 'Cropping2D', (), {}),
+        (d, 'Cropping3D', (), {})]),
+    
+    ('convolutional_recurrent', [
+        (dd, 'ConvRNN2D', (), {'layer_cell': ('ConvLSTM2DCell', (9, 1), {})}),
+        (dd, 'ConvLSTM2D', (10, 1), {})]),
+    
+    ('core', [
+        (a, 'Masking', (), {}),
+        (a, 'Dropout', (1.0,), {}),
+        (b, 'SpatialDropout1D', (1.0,), {}),
+        (c, 'SpatialDropout2D', (1.0,), {}),
+        (d, 'SpatialDropout3D', (1.0,), {}),
+        (a, 'Activation', ('relu',), {}),
+        (b, 'Reshape', (), {'target_shape': (5, 20)}),
+        (b, 'Permute', ((2, 1),), {}),
+        (b, 'Flatten', (), {}),
+        (a, 'RepeatVector', (3,), {}),
+        (a, 'Lambda', ((lambda x: x ** 2),), {}),
+        (a, 'Dense', (10,), {}),
+        (a, 'ActivityRegularization', (), {})]),
+    
+    ('cudnn_recurrent', [ #need cuda support to test
+        (b, 'CuDNNGRU', (10,), {}),
+        (b, 'CuDNNLSTM', (10,), {})]),
+    
+    ('embeddings', [
+        (a, 'Embedding', (1000, 64), {})]),
+    
+    ('local', [
+        (b, 'LocallyConnected1D', (10, 1), {}),
+        (c, 'LocallyConnected2D', (10, 1), {})]),
+    
+    ('merge', [
+        ([a, a, a], 'Add', (), {}),
+        ([a, a], 'Subtract', (), {}),
+        ([a, a, a], 'Multiply', (), {}),
+        ([a, a, a], 'Average', (), {}),
+        ([a, a, a], 'Maximum', (), {}),
+        ([a, a, a], 'Minimum', (), {}),
+        ([a, a, a], 'Concatenate', (), {}),
+        ([a, a], 'Dot', (), {'axes': -1})]),
+    
+    ('noise', [
+        (a, 'GaussianNoise', (1.0,), {}),
+        (a, 'GaussianDropout', (1.0,), {}),
+        (a, 'AlphaDropout', (1.0,), {})]),
+    
+    ('normalization', [
+        (a, 'BatchNormalization', (), {})]),
+    
+    ('pooling', [
+        (b, 'MaxPooling1D', (), {}),
+        (b, 'AveragePooling1D', (), {}),
+        (c, 'MaxPooling2D', (), {}),
+        (c, 'AveragePooling2D', (), {}),
+        (d, 'MaxPooling3D', (), {}),
+        (d, 'AveragePooling3D', (), {}),
+        (b, 'GlobalAveragePooling1D', (), {}),
+        (b, 'GlobalMaxPooling1D', (), {}),
+        (c, 'GlobalAveragePooling2D', (), {}),
+        (c, 'GlobalMaxPooling2D', (), {}),
+        (d, 'GlobalAveragePooling3D', (), {}),
+        (d, 'GlobalMaxPooling3D', (), {})]),
+    
+    ('recurrent', [
+        (bb, 'RNN', (), {'layer_cell': ('StackedRNNCells', (), {'layer_cell': [('GRUCell', (10,), {}), ('LSTMCell', (10,), {}), ('SimpleRNNCell', (10,), {})]})}),
+        (bb, 'RNN', (), {'layer_cell': ('SimpleRNNCell', (10,), {})}),
+        (bb, 'SimpleRNN', (10,), {}),
+        (bb, 'RNN', (), {'layer_cell': ('GRUCell', (10,), {})}),
+        (bb, 'GRU', (10,), {}),
+        (bb, 'RNN', (), {'layer_cell': ('LSTMCell', (10,), {})}),
+        (bb, 'LSTM', (10,), {})]),
+    
+    ('wrappers', [
+        (b, 'TimeDistributed', (), {'layer_cell': ('Dense', (10,), {})}),
+        (bb, 'Bidirectional', (), {'layer_cell': ('LSTM', (10,), {})})])])
+
+def describe(layer_cell):
+    '''
+        Returns a readable name of a 'layer_cell' entry, e.g.
+        'StackedRNNCells(GRUCell, LSTMCell, SimpleRNNCell)'.
+    '''
+    class_name, arg, kwargs = layer_cell
+    
+    if 'layer_cell' in kwargs:
+        cells = kwargs['layer_cell'] if isinstance(kwargs['layer_cell'], list) else [kwargs['layer_cell']]
+        return '{}({})'.format(class_name, ', '.join(describe(cell) for cell in cells))
+    else:
+        return class_name
+
+def build(get, layer_cell):
+    '''
+        Instantiates a (class_name, arg, kwargs) entry with
+        'get' (e.g. KASD.layers.get), including its
+        'layer_cell'. The entry is not modified.
+    '''
+    class_name, arg, kwargs = layer_cell
+    cls = get(class_name)
+    
+    if cls is None:
+        raise NotImplementedError(class_name)
+    
+    kwargs = dict(kwargs)
+    if 'layer_cell' in kwargs:
+        layer_cell = kwargs.pop('layer_cell')
+        
+        if isinstance(layer_cell, list):
+            arg = ([build(get, cell) for cell in layer_cell],)+tuple(arg)
+        else:
+            arg = (build(get, layer_cell),)+tuple(arg)
+    
+    return cls(*arg, **kwargs)
@@ -1,49 +1,26 @@
-from KASDTools.layers import get, serialize, deserialize
+from KASD.layers import get, serialize, deserialize, WeightStore, IncrementalSerializer
+from KASD.shapes import compute_output_shape, _SHAPE_FUNCTIONS
 from keras.layers import Input
+from keras import activations
 
+from layer_matrix import LAYER_MATRIX, describe, build
+
+import numpy as np
 import traceback
 
 def checkPerformance(print_results=False):
-    def get_sub_cls(sub_class_name, sub_arg, sub_kwargs):
-        sub_cls = get(sub_class_name)
-        
-        if sub_cls is None:
-            raise NotImplementedError(sub_class_name)
-        
-        if 'layer_cell' in sub_kwargs:
-            layer_cell = sub_kwargs['layer_cell']
-            
-            if isinstance(layer_cell, list):
-                sub_sub_cls = ([get_sub_cls(*LS) for LS in layer_cell],)
-            else:
-                sub_sub_cls = (get_sub_cls(layer_cell),)
-            
-            sub_arg = sub_sub_cls+sub_arg
-            del sub_kwargs['layer_cell']
-        return sub_cls(*sub_arg, **sub_kwargs)
-        
     def checkFunctionality(input_batch_shape, class_name, *arg, **kwargs):
         _input = Input(batch_shape=input_batch_shape) if isinstance(input_batch_shape, tuple) else [Input(batch_shape=batch_shape) for batch_shape in input_batch_shape]
         
         print('='*(40+60*print_results))
         
-        check_list = {"Build": False, "Serialization": False, "Deserialization": False}
+        check_list = {"Build": False, "Serialization": False, "Shape Inference": False, "Deserialization": False}
         print('{} Test Results:'.format(class_name))
         
         #######Build Test#######
         
         try:
-            cls = get(class_name)
-            
-            if cls is None:
-                raise NotImplementedError(class_name)
-            
-            if 'layer_cell' in kwargs:
-                sub_class_name, sub_arg, sub_kwargs = kwargs['layer_cell']
-                arg = (get_sub_cls(sub_class_name, sub_arg, sub_kwargs),)+arg
-                del kwargs['layer_cell']
-            
-            tensor = cls(*arg, **kwargs)(_input)
+            tensor = build(get, (class_name, arg, kwargs))(_input)
             tensors = (_input if isinstance(_input, list) else [_input])+[tensor]
             
             check_list['Build'] = True
@@ -64,6 +41,21 @@ def checkPerformance(print_results=False):
                 print('Serialization: Failed')
                 traceback.print_exc()
         
+        #######Shape Inference Test#######
+        
+        if check_list['Serialization']:
+            if not class_name in _SHAPE_FUNCTIONS: #e.g. Lambda, only inferred through keras
+                print('Shape Inference: Skipped (no shape function)')
+                check_list['Shape Inference'] = True
+            else:
+                try:
+                    output_shape = compute_output_shape(serial, fallback=False)
+                    assert output_shape == serial['output_shape'], '{} != {}'.format(output_shape, serial['output_shape'])
+                    check_list['Shape Inference'] = True
+                except:
+                    print('Shape Inference: Failed')
+                    traceback.print_exc()
+        
         #######Deserialization Test#######
         
         if check_list['Build'] and check_list['Serialization']:
@@ -81,120 +73,67 @@ def checkPerformance(print_results=False):
             print('Fully Functional!')
         print()
     
-    a = (None, 10)
-    b = (None, 10, 10)
-    bb = (10, 10, 10)
-    c = (None, 10, 10, 10)
-    cc = (10, 10, 10, 10)
-    d = (None, 10, 10, 10, 10)
-    dd = (10, 10, 10, 10, 10)
-    
-    #advanced_activations
-    checkFunctionality(a, 'LeakyReLU')
-    checkFunctionality(a, 'PReLU')
-    checkFunctionality(a, 'ThresholdedReLU')
-    checkFunctionality(a, 'Softmax')
-    checkFunctionality(a, 'ReLU')
-    
-    #convolutional
-    checkFunctionality(b, 'Conv1D', *(10, 1))
-    checkFunctionality(c, 'Conv2D', *(10, 1))
-    checkFunctionality(d, 'Conv3D', *(10, 1))
-    checkFunctionality(c, 'Conv2DTranspose', *(10, 1))
-    checkFunctionality(d, 'Conv3DTranspose', *(10, 1))
-    checkFunctionality(b, 'SeparableConv1D', *(10, 1))
-    checkFunctionality(c, 'SeparableConv2D', *(10, 1))
-    checkFunctionality(c, 'DepthwiseConv2D', *(1,))
-    checkFunctionality(b, 'UpSampling1D')
-    checkFunctionality(c, 'UpSampling2D')
-    checkFunctionality(d, 'UpSampling3D')
-    checkFunctionality(b, 'ZeroPadding1D')
-    checkFunctionality(c, 'ZeroPadding2D')
-    checkFunctionality(d, 'ZeroPadding3D')
-    checkFunctionality(b, 'Cropping1D')
-    checkFunctionality(c, 'Cropping2D')
-    checkFunctionality(d, 'Cropping3D')
-    
-    #convolutional_recurrent
-    print('(ConvLSTM2DCell)')
-    checkFunctionality(dd, 'ConvRNN2D', layer_cell=('ConvLSTM2DCell', (9, 1), {}))
-    checkFunctionality(dd, 'ConvLSTM2D', *(10, 1))
-    
-    #core
-    checkFunctionality(a, 'Masking')
-    checkFunctionality(a, 'Dropout', *(1.0,))
-    checkFunctionality(b, 'SpatialDropout1D', *(1.0,))
-    checkFunctionality(c, 'SpatialDropout2D', *(1.0,))
-    checkFunctionality(d, 'SpatialDropout3D', *(1.0,))
-    checkFunctionality(a, 'Activation', *('relu',))
-    checkFunctionality(b, 'Reshape', target_shape=(5, 20))
-    checkFunctionality(b, 'Permute', *((2, 1),))
-    checkFunctionality(b, 'Flatten')
-    checkFunctionality(a, 'RepeatVector', *(3,))
-    checkFunctionality(a, 'Lambda', *((lambda x: x ** 2), ))
-    checkFunctionality(a, 'Dense', *(10,))
-    checkFunctionality(a, 'ActivityRegularization')
-    
-    #cudnn_recurrent
-    checkFunctionality(b, 'CuDNNGRU', *(10,)) #need cuda support to test
-    checkFunctionality(b, 'CuDNNLSTM', *(10,)) #need cuda support to test
-    
-    #embeddings
-    checkFunctionality(a, 'Embedding', *(1000, 64))
-    
-    #local
-    checkFunctionality(b, 'LocallyConnected1D', *(10, 1))
-    checkFunctionality(c, 'LocallyConnected2D', *(10, 1))
+    for family, entries in LAYER_MATRIX.items():
+        for input_batch_shape, class_name, arg, kwargs in entries:
+            if class_name in ('RNN', 'ConvRNN2D'):
+                print('({})'.format(describe(kwargs['layer_cell'])))
+            
+            checkFunctionality(input_batch_shape, class_name, *arg, **kwargs)
     
-    #merge
-    checkFunctionality([a, a, a], 'Add')
-    checkFunctionality([a, a], 'Subtract')
-    checkFunctionality([a, a, a], 'Multiply')
-    checkFunctionality([a, a, a], 'Average')
-    checkFunctionality([a, a, a], 'Maximum')
-    checkFunctionality([a, a, a], 'Minimum')
-    checkFunctionality([a, a, a], 'Concatenate')
-    checkFunctionality([a, a], 'Dot', axes=-1)
+def checkWeights():
+    '''
+        Round trip of layer weights through a WeightStore, with
+        and without catch_input_errors (where the layer built by
+        deserialize is a deepcopy).
+    '''
+    print('='*40)
+    print('Weights Test Results:')
     
-    #noise
-    checkFunctionality(a, 'GaussianNoise', *(1.0,))
-    checkFunctionality(a, 'GaussianDropout', *(1.0,))
-    checkFunctionality(a, 'AlphaDropout', *(1.0,))
+    tensor = get('Dense')(10)(Input(batch_shape=(None, 10)))
+    expected = tensor._keras_history[0].get_weights()
     
-    #normalization
-    checkFunctionality(a, 'BatchNormalization')
+    store = WeightStore()
+    serial = serialize(tensor, weights=store)
     
-    #pooling
-    checkFunctionality(b, 'MaxPooling1D')
-    checkFunctionality(b, 'AveragePooling1D')
-    checkFunctionality(c, 'MaxPooling2D')
-    checkFunctionality(c, 'AveragePooling2D')
-    checkFunctionality(d, 'MaxPooling3D')
-    checkFunctionality(d, 'AveragePooling3D')
-    checkFunctionality(b, 'GlobalAveragePooling1D')
-    checkFunctionality(b, 'GlobalMaxPooling1D')
-    checkFunctionality(c, 'GlobalAveragePooling2D')
-    checkFunctionality(c, 'GlobalMaxPooling2D')
-    checkFunctionality(d, 'GlobalAveragePooling3D')
-    checkFunctionality(d, 'GlobalMaxPooling3D')
+    for catch_input_errors in (False, True):
+        try:
+            weights = deserialize(serial, weights=store, catch_input_errors=catch_input_errors)._keras_history[0].get_weights()
+            assert len(weights) == len(expected) and all(np.array_equal(a, b) for a, b in zip(weights, expected))
+            print('catch_input_errors={}: Passed'.format(catch_input_errors))
+        except:
+            print('catch_input_errors={}: Failed'.format(catch_input_errors))
+            traceback.print_exc()
+    print()
+
+def checkIncremental():
+    '''
+        IncrementalSerializer matches serialize across calls,
+        including after a config edit that keeps the shapes.
+    '''
+    print('='*40)
+    print('Incremental Serializer Test Results:')
     
-    #recurrent
-    print('(StackedRNNCells(GRUCell, LSTMCell, SimpleRNNCell))')
-    checkFunctionality(bb, 'RNN', layer_cell=('StackedRNNCells', (), {'layer_cell': [('GRUCell', (10,), {}), ('LSTMCell', (10,), {}), ('SimpleRNNCell', (10,), {})]}))
-    print('(SimpleRNNCell)')
-    checkFunctionality(bb, 'RNN', layer_cell=('SimpleRNNCell', (10,), {}))
-    checkFunctionality(bb, 'SimpleRNN', *(10,))
-    print('(GRUCell)')
-    checkFunctionality(bb, 'RNN', layer_cell=('GRUCell', (10,), {}))
-    checkFunctionality(bb, 'GRU', *(10,))
-    print('(LSTMCell)')
-    checkFunctionality(bb, 'RNN', layer_cell=('LSTMCell', (10,), {}))
-    checkFunctionality(bb, 'LSTM', *(10,))
+    first = get('Dense')(10)(Input(batch_shape=(None, 10)))
+    second = get('Dense')(5)(first)
     
-    #wrappers
-    checkFunctionality(b, 'TimeDistributed', layer_cell=('Dense', (10,), {}))
-    checkFunctionality(bb, 'Bidirectional', layer_cell=('LSTM', (10,), {}))
+    serializer = IncrementalSerializer()
     
+    try:
+        assert serializer([first, second]) == serialize([first, second])
+        assert serializer([first, second]) == serialize([first, second])
+        
+        first._keras_history[0].activation = activations.get('relu')
+        series = serializer([first, second])
+        assert series[first._keras_history[0].name]['config']['activation'] == 'relu'
+        assert series == serialize([first, second])
+        print('Passed')
+    except:
+        print('Failed')
+        traceback.print_exc()
+    print()
+
 checkPerformance()
+checkWeights()
+checkIncremental()
 
 
@@ -0,0 +1,354 @@
+'''
+Description:
+    Behaviour tests of the pure python tools of KASD (storage,
+    graph, shapes and costs). None of them need keras.
+
+Usage:
+    python tests/test_tools.py
+    
+    or
+    
+    python -m pytest tests/test_tools.py
+'''
+
+from KASD import Collection
+from KASD.storage import dump, load, WeightStore
+from KASD.graph import topological_sort, diff, apply_patch, extract, splice
+from KASD.shapes import propagate
+from KASD.costs import compute_cost, estimate
+from KASD.layers import plan_patches
+
+import numpy as np
+import tempfile
+import os
+import io
+
+def dense(name, input_name, units, input_units):
+    return {'class_name': 'Dense', 'config': {'name': name, 'units': units, 'activation': None, 'use_bias': True},
+            'input': [input_name], 'input_shape': (None, input_units), 'output_shape': (None, units)}
+
+def example_series():
+    '''
+        Returns a small advanced series with nested configs,
+        multiple inputs and json-like values of every kind.
+    '''
+    series = {'dense_1': dense('dense_1', 'input_1', 8, 4), 'dense_2': dense('dense_2', 'dense_1', 8, 8)}
+    series['dense_1']['config'].update({'kernel_initializer': {'class_name': 'VarianceScaling', 'config': {'scale': 1.0, 'seed': None}},
+                                        'rate': 0.5, 'dims': (2, 1), 'axes': [1, -1], 'mixed': [1, 'a', None], 'empty': [], 'big': 2**70})
+    series['add_1'] = {'class_name': 'Add', 'config': {'name': 'add_1'}, 'input': ['dense_1', 'dense_2'],
+                       'input_shape': [(None, 8), (None, 8)], 'output_shape': (None, 8)}
+    return series
+
+######Collection######
+
+def test_collection_pool_invalidation():
+    collection = Collection(['Dense', 'Conv1D'])
+    assert collection._pool(collection._signature([], [], [])) == ('Dense', 'Conv1D')
+    
+    class KASDTestLayer(object):
+        pass
+    
+    collection.custom(KASDTestLayer)
+    assert collection._pool(collection._signature([], [], [])) == ('Dense', 'Conv1D', 'KASDTestLayer')
+    assert collection.choice(exclude=['Dense', 'Conv1D']) == 'KASDTestLayer'
+    
+    try:
+        collection.choice(labels='conv') #caches an empty pool
+        assert False, 'empty pool not reported'
+    except IndexError:
+        pass
+    
+    collection.label('conv', func='Conv1D')
+    assert collection.choice(labels='conv') == 'Conv1D'
+    collection.label('conv', func=KASDTestLayer)
+    assert collection._pool(collection._signature([], [], [], labels='conv')) == ('Conv1D', 'KASDTestLayer')
+
+def test_collection_sample_weights():
+    collection = Collection(['Dense', 'Conv1D', 'LSTM'], seed=0)
+    
+    names = collection.sample(1000, weights={'Dense': 0.0, 'LSTM': 3.0})
+    assert len(names) == 1000 and not 'Dense' in names
+    assert 2*names.count('Conv1D') < names.count('LSTM')
+    
+    assert set(collection.sample(50, exclude='LSTM')) == set(['Dense', 'Conv1D'])
+    assert collection.sample(0) == []
+
+def test_collection_labels():
+    collection = Collection(['Dense', 'Conv1D', 'Conv2D', 'LSTM'], seed=0)
+    collection.label(['conv', 'spatial'], func='Conv2D')
+    collection.label('conv', func='Conv1D')
+    collection.label('recurrent', func='LSTM')
+    
+    def pool(**filters):
+        return set(collection.sample(200, **filters))
+    
+    assert pool(labels='conv') == set(['Conv1D', 'Conv2D'])
+    assert pool(labels=['conv', 'recurrent']) == set(['Conv1D', 'Conv2D', 'LSTM'])
+    assert pool(labels=['conv', 'spatial'], match_all=True) == set(['Conv2D'])
+    assert pool(exclude_labels='conv') == set(['Dense', 'LSTM'])
+    assert pool(labels='conv', exclude_labels='spatial') == set(['Conv1D'])
+    assert collection.choice(labels='conv', exclude='Conv1D') == 'Conv2D'
+
+def test_collection_seeds():
+    names = ['Dense', 'Conv1D', 'LSTM', 'GRU']
+    collection = Collection(names, seed=7)
+    first = collection.sample(20)
+    
+    collection.seed(7)
+    assert collection.sample(20) == first
+    assert Collection(names).sample(20, seed=7) == first
+    assert len(set(collection.choice(seed=3) for _ in range(5))) == 1
+    
+    streams = [Collection(names, seed=seed).sample(20) for seed in collection.spawn(3)]
+    assert len(set(tuple(stream) for stream in streams+[first])) == 4
+    assert collection.spawn(1)[0].spawn_key != collection.spawn(1)[0].spawn_key
+
+######Storage######
+
+def test_storage_round_trip():
+    series = example_series()
+    
+    f = io.BytesIO()
+    assert dump(series, f) == len(series)
+    
+    loaded = load(f.getvalue())
+    assert list(loaded) == list(series)
+    assert dict(loaded) == series
+    assert loaded['add_1'] == series['add_1'] #lazy access of a single layer
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'series.kasd')
+        dump(iter(series.items()), path)
+        
+        for use_mmap in (True, False):
+            loaded = load(path, use_mmap=use_mmap)
+            assert dict(loaded) == series
+            loaded.close()
+
+def test_weight_store_round_trip():
+    arrays = [np.arange(12, dtype='float32').reshape(3, 4), np.ones(5, dtype='float64'), np.array(3, dtype='int32')]
+    
+    store = WeightStore()
+    references = [store.put(array) for array in arrays]
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'weights.npy')
+        store.save(path)
+        
+        for use_mmap in (True, False):
+            loaded = WeightStore.load(path, use_mmap=use_mmap)
+            
+            for array, reference in zip(arrays, references):
+                view = loaded.get(reference)
+                assert view.dtype == array.dtype and view.shape == array.shape
+                assert np.array_equal(view, array)
+            
+            del loaded, view
+
+######Graph######
+
+def test_topological_sort_is_stable():
+    series = {'a': dense('a', 'input_1', 8, 4), 'b': dense('b', 'a', 8, 8), 'c': dense('c', 'input_1', 8, 4)}
+    assert list(topological_sort(series)) == ['a', 'b', 'c']
+    
+    shuffled = dict((name, series[name]) for name in ('b', 'c', 'a'))
+    assert list(topological_sort(shuffled)) == ['a', 'b', 'c']
+    
+    series['a'] = dense('a', 'b', 8, 8)
+    try:
+        topological_sort(series)
+        assert False, 'cycle not detected'
+    except ValueError:
+        pass
+
+def test_diff_round_trip():
+    a = example_series()
+    b = example_series()
+    
+    del b['dense_2']
+    b['add_1'] = dict(b['add_1'], input=['dense_1', 'input_1'])
+    b['dense_1'] = dict(b['dense_1'], weights=[{'offset': 0, 'shape': (4, 8), 'dtype': 'float32'}], compact=True,
+                        inbound_nodes=[[['input_1', 0, 0, (None, 4)]], [['input_2', 0, 0, (None, 4)]]])
+    b['dense_1']['config'] = dict(b['dense_1']['config'], units=16)
+    del b['dense_1']['config']['rate']
+    b['dense_3'] = dense('dense_3', 'add_1', 2, 8)
+    
+    patch = diff(a, b)
+    assert patch['removed'] == ['dense_2'] and list(patch['added']) == ['dense_3']
+    assert sorted(patch['changed']['dense_1']['set']) == ['compact', 'inbound_nodes', 'weights']
+    assert patch['changed']['dense_1']['config'] == {'set': {'units': 16}, 'unset': ['rate']}
+    assert apply_patch(a, patch) == b
+    assert diff(b, a)['changed']['dense_1']['unset'] == ['weights', 'compact', 'inbound_nodes']
+    assert apply_patch(b, diff(b, a)) == a
+    assert diff(a, a) == {'added': {}, 'removed': [], 'changed': {}}
+
+def test_propagate_chain_and_merge():
+    series = {'a': dense('a', 'input_1', 8, 4), 'b': dense('b', 'a', 8, 8), 'c': dense('c', 'b', 2, 8)}
+    series['concat'] = {'class_name': 'Concatenate', 'config': {'name': 'concat', 'axis': -1}, 'input': ['a', 'c'],
+                        'input_shape': [(None, 8), (None, 2)], 'output_shape': (None, 10)}
+    
+    series['a']['config']['units'] = 6
+    assert propagate(series, ['a']) == ['a', 'concat'] #'b' keeps its output shape
+    assert series['b']['input_shape'] == (None, 6) and series['b']['output_shape'] == (None, 8)
+    assert series['c']['input_shape'] == (None, 8) and series['c']['output_shape'] == (None, 2)
+    assert series['concat']['input_shape'] == [(None, 6), (None, 2)] and series['concat']['output_shape'] == (None, 8)
+    
+    series['c']['config']['units'] = 4
+    assert propagate(series, ['c']) == ['c', 'concat']
+    assert series['concat']['input_shape'] == [(None, 6), (None, 4)] and series['concat']['output_shape'] == (None, 10)
+
+def test_splice_reshapes_boundary():
+    source = {'a': dense('a', 'in', 8, 4), 'b': dense('b', 'a', 2, 8)}
+    target = {'x': dense('x', 'input_1', 6, 4)}
+    
+    assert splice(target, extract(source, inputs=['in'], outputs=['b']), at={'in': 'x'}) == {'a': 'a', 'b': 'b'}
+    assert target['a']['input'] == ['x'] and target['a']['input_shape'] == (None, 6)
+    assert target['b']['input_shape'] == (None, 8) and target['b']['output_shape'] == (None, 2)
+    
+    source['a']['class_name'] = 'Unknown' #no shape function
+    target = {'x': dense('x', 'input_1', 6, 4)}
+    try:
+        splice(target, extract(source, inputs=['in'], outputs=['b']), at={'in': 'x'}, fallback=False)
+        assert False, 'unknown layer not reported'
+    except Exception:
+        assert list(target) == ['x']
+
+def shared_series():
+    '''
+        Returns an advanced series with a shared layer called on
+        'input_1' and on the output of 'dense_a'.
+    '''
+    series = {'dense_a': dense('dense_a', 'input_1', 4, 4), 'shared': dense('shared', 'input_1', 8, 4)}
+    series['shared']['inbound_nodes'] = [[['input_1', 0, 0, (None, 4)]], [['dense_a', 0, 0, (None, 4)]]]
+    return series
+
+def test_shared_layer_references():
+    series = shared_series()
+    assert sorted(extract(series, outputs=['shared'])) == ['dense_a', 'shared']
+    
+    target = shared_series()
+    names = splice(target, extract(series, outputs=['shared']))
+    assert names == {'dense_a': 'dense_a_1', 'shared': 'shared_1'}
+    assert target['shared_1']['inbound_nodes'][1][0][0] == 'dense_a_1'
+    assert target['shared']['inbound_nodes'][1][0][0] == 'dense_a'
+    
+    series['dense_a']['config']['units'] = 6
+    propagate(series, ['dense_a'])
+    assert series['dense_a']['output_shape'] == (None, 6)
+    assert series['shared']['inbound_nodes'][1][0][3] == (None, 6)
+    assert series['shared']['inbound_nodes'][0][0][3] == (None, 4)
+
+######Patches######
+
+def layer(name, input_name, input_shape, output_shape):
+    return {'class_name': 'Layer', 'config': {'name': name}, 'input': [input_name], 'input_shape': input_shape, 'output_shape': output_shape}
+
+def test_plan_patches():
+    series = {'a': layer('a', 'input_1', (None, 4), (None, 4, 4)),
+              'b': layer('b', 'a', (None, 2, 3), (None, 6)),
+              'c': layer('c', 'a', (None, 2, 3), (None, 6)),
+              'd': layer('d', 'a', (None, None, 3), (None, 3)),
+              'e': layer('e', 'b', (None, 3), (None, 3))}
+    series['e']['inbound_nodes'] = [[['b', 0, 0, (None, 3)]], [['input_1', 0, 0, (None, 4)]]]
+    
+    planned, report = plan_patches(series)
+    
+    chain = ['a/Flatten/patch', 'a/Flatten/patch/Dense/patch', 'a/Flatten/patch/Dense/patch/Reshape/patch']
+    assert [(entry['layer'], entry['patches']) for entry in report] == [('b', chain), ('c', chain), ('d', None), ('e', ['b/Dense/patch'])]
+    assert report[0]['expected'] == (None, 2, 3) and report[0]['received'] == (None, 4, 4)
+    
+    assert list(planned) == ['a']+chain+['b', 'c', 'd', 'b/Dense/patch', 'e'] #patches are planned once
+    assert [planned[name]['output_shape'] for name in chain] == [(None, 16), (None, 6), (None, 2, 3)]
+    assert planned[chain[1]]['config']['units'] == 6 and planned[chain[2]]['config']['target_shape'] == (2, 3)
+    assert planned['b']['input'] == planned['c']['input'] == [chain[-1]]
+    assert planned['d']['input'] == ['a']
+    
+    assert planned['e']['inbound_nodes'] == [[['b/Dense/patch', 0, 0, (None, 3)]], [['input_1', 0, 0, (None, 4)]]]
+    assert series['e']['input'] == ['b'] #the series is not modified
+
+######Streaming######
+
+def test_iter_deserialize_releases_pending_layers():
+    import KASD.layers
+    
+    def build(adv_serial, series, custom_objects, copy_config, weights=None):
+        for input_name in adv_serial['input']:
+            series.setdefault(input_name, input_name) #Input placeholder
+        return adv_serial['config']['name']
+    
+    stream = [('b', dense('b', 'a', 8, 8)), ('a', dense('a', 'in_2', 8, 4)), ('c', dense('c', 'a', 8, 8))]
+    stream[0][1]['input'] = ['a', 'in_1']
+    
+    original, KASD.layers._build = KASD.layers._build, build
+    try:
+        events = []
+        
+        def read():
+            for name, value in stream:
+                events.append('read ' + name)
+                yield name, value
+        
+        for tensor in KASD.layers.iter_deserialize(read(), inputs=['in_1', 'in_2']):
+            events.append(tensor)
+        
+        #'b' is built as soon as 'a' is, before 'c' is read
+        assert events == ['read b', 'read a', 'in_2', 'a', 'in_1', 'b', 'read c', 'c']
+    finally:
+        KASD.layers._build = original
+
+######Compact######
+
+class Scaled(object):
+    constructed = 0
+    
+    def __init__(self, units, scale=1.0, bias=None, name=None):
+        self.config = {'name': name, 'units': units, 'scale': scale, 'bias': bias}
+    
+    @classmethod
+    def from_config(cls, config):
+        cls.constructed += 1
+        return cls(**config)
+    
+    def get_config(self):
+        return dict(self.config)
+
+def test_compact_defaults_per_class():
+    from KASD.layers import _compact_config, _default_config
+    
+    full = {'name': 'a', 'units': 4, 'scale': 1.0, 'bias': [0, 1]}
+    compact = _compact_config(Scaled, full)
+    assert compact == {'name': 'a', 'units': 4, 'bias': [0, 1]}
+    assert _compact_config(Scaled, {'name': 'b', 'units': 3, 'scale': 1.0, 'bias': None}) == {'name': 'b', 'units': 3}
+    assert _compact_config(Scaled, {'name': 'c', 'units': 5, 'scale': 2.0, 'bias': None}) == {'name': 'c', 'units': 5, 'scale': 2.0}
+    assert dict(_default_config(Scaled, compact)[1], **compact) == full
+    assert Scaled.constructed == 1
+
+######Costs######
+
+def recurrent(class_name, units, input_units, **config):
+    return {'class_name': class_name, 'config': dict(config, name=class_name.lower(), units=units), 'input': ['input_1'],
+            'input_shape': (None, 5, input_units), 'output_shape': (None, units)}
+
+def test_costs():
+    serial = dense('dense_1', 'input_1', 8, 4)
+    assert compute_cost(serial) == (40, 32, 8)
+    serial['config']['use_bias'] = False
+    assert compute_cost(serial).params == 32
+    
+    assert compute_cost(recurrent('LSTM', 2, 3)).params == 4*2*(3+2)+4*2
+    assert compute_cost(recurrent('GRU', 2, 3, reset_after=True)).params == 3*2*(3+2)+2*3*2
+    assert compute_cost(recurrent('GRU', 2, 3, reset_after=True, use_bias=False)).params == 3*2*(3+2)
+    assert compute_cost(recurrent('LSTM', 2, 3, use_bias=False)).macs == 5*4*2*(3+2)
+    
+    series = example_series()
+    result = estimate(series, batch_size=2, bytes_per_element=4)
+    assert list(result['layers']) == ['dense_1', 'dense_2', 'add_1']
+    assert result['params'] == 40+72
+    assert result['macs'] == 2*(32+64)
+    assert result['peak_memory'] == 2*4*(8+8+8) #dense_1 is kept for add_1
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print('{}: Passed'.format(name))